@@ -2,30 +2,37 @@
 # -*- coding: utf-8 -*-
 import json
 import os
+import copy
 import logging
 from pathlib import Path
 from datetime import datetime
 import io
+import queue
+import atexit
 import threading # Added for GDrive auth thread
+import httplib2
 from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.http import MediaIoBaseDownload, MediaInMemoryUpload
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 # Import SecureStorage (assuming it's in src/utils/security.py)
 # Need to handle potential import errors if structure changes
 try:
     from src.utils.security import SecureStorage
 except ImportError:
-    logging.error("Could not import SecureStorage. API key functionality will be limited.")
+    logger.error("Could not import SecureStorage. API key functionality will be limited.")
     SecureStorage = None # Define as None if import fails
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - Storage - %(message)s")
-
 # --- Configuration Loading ---
+# Parsed settings keyed by file path, stored with the (mtime_ns, size) they were read at
+_settings_cache = {}
+
 def load_settings():
     """Loads settings from config/settings.json, merging with defaults."""
     settings_path = Path(__file__).resolve().parent.parent.parent / "config" / "settings.json"
@@ -59,10 +66,19 @@ def load_settings():
     }
     
     if not settings_path.exists():
-        logging.warning(f"Settings file not found at {settings_path}. Using default settings.")
+        logger.warning("Settings file not found at %s. Using default settings.", settings_path)
         settings_path.parent.mkdir(parents=True, exist_ok=True)
         return default_settings
         
+    try:
+        stat = settings_path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = _settings_cache.get(str(settings_path))
+        if cached is not None and cached[0] == signature:
+            return copy.deepcopy(cached[1])
+    except OSError:
+        signature = None
+
     try:
         with open(settings_path, "r", encoding="utf-8") as f:
             loaded_settings = json.load(f)
@@ -81,13 +97,15 @@ def load_settings():
             
             # Ensure token filename default is updated if loaded from old settings
             if merged_settings.get("google_drive_token_file") == "token.pickle":
-                logging.warning("Updating default token filename from token.pickle to token.json in loaded settings.")
+                logger.warning("Updating default token filename from token.pickle to token.json in loaded settings.")
                 merged_settings["google_drive_token_file"] = "token.json"
-                
+
+            if signature is not None:
+                _settings_cache[str(settings_path)] = (signature, copy.deepcopy(merged_settings))
             return merged_settings
             
     except (json.JSONDecodeError, IOError) as e:
-        logging.error(f"Error loading settings from {settings_path}: {e}. Using default settings.")
+        logger.error("Error loading settings from %s: %s. Using default settings.", settings_path, e)
         return default_settings.copy() # Return a copy of defaults on error
 
 def save_settings(settings: dict):
@@ -108,15 +126,22 @@ def save_settings(settings: dict):
             if "api_key_stored" in settings_to_save["api_providers"][provider]:
                  del settings_to_save["api_providers"][provider]["api_key_stored"]
 
+    _settings_cache.pop(str(settings_path), None)
     try:
         settings_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(settings_path, "w", encoding="utf-8") as f:
+        # Write to a temp file and swap it in so a crash never leaves a truncated settings.json
+        tmp_path = settings_path.with_name(settings_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(settings_to_save, f, indent=4, ensure_ascii=False)
-        logging.info(f"Saved non-sensitive settings to {settings_path}")
+        os.replace(tmp_path, settings_path)
+        logger.info("Saved non-sensitive settings to %s", settings_path)
     except IOError as e:
-        logging.error(f"Error saving settings to {settings_path}: {e}")
+        logger.error("Error saving settings to %s: %s", settings_path, e)
 
 # --- Local Storage Manager ---
+WRITE_QUEUE_SIZE = 1024 # save_message blocks once this many messages are waiting
+WRITE_BATCH_SIZE = 64 # Max messages folded into a single file rewrite
+
 class LocalStorageManager:
     """Manages saving and loading conversation history to a local JSON file."""
 
@@ -125,49 +150,101 @@ class LocalStorageManager:
             try:
                 custom_path = Path(storage_path).resolve()
                 self.history_dir = custom_path
-                logging.info(f"Using custom local storage path: {self.history_dir}")
+                logger.info("Using custom local storage path: %s", self.history_dir)
             except Exception as e:
-                logging.error(f"Invalid custom storage path \"{storage_path}\": {e}. Falling back to default.")
+                logger.error("Invalid custom storage path \"%s\": %s. Falling back to default.", storage_path, e)
                 self.history_dir = Path.home() / ".jarvis-core" / "history"
         else:
             self.history_dir = Path.home() / ".jarvis-core" / "history"
-            logging.info("Using default local storage path.")
+            logger.info("Using default local storage path.")
 
         try:
             self.history_dir.mkdir(parents=True, exist_ok=True)
             self.filepath = self.history_dir / filename
-            logging.info(f"LocalStorageManager initialized. History file path: {self.filepath}")
+            logger.info("LocalStorageManager initialized. History file path: %s", self.filepath)
         except Exception as e:
-            logging.error(f"Failed to create history directory or set filepath {self.history_dir / filename}: {e}", exc_info=True)
+            logger.error("Failed to create history directory or set filepath %s: %s", self.history_dir / filename, e, exc_info=True)
             self.filepath = self.history_dir / filename
 
+        # Saves are handed to a single writer thread, started on the first save
+        self._write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
     def save_message(self, sender: str, message: str):
+        """Queues a message for the background writer and returns immediately."""
         entry = {
             "timestamp": datetime.now().isoformat(),
             "sender": sender,
             "message": message
         }
+        self._start_writer()
+        self._write_queue.put(entry)
+
+    def flush(self):
+        """Blocks until every queued message has been written to disk."""
+        self._write_queue.join()
+
+    def _start_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name="LocalStorageWriter", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush) # Don't lose queued messages on shutdown
+
+    def _writer_loop(self):
+        while True:
+            entries = [self._write_queue.get()]
+            # Drain whatever else is already queued so a burst costs one file rewrite
+            while len(entries) < WRITE_BATCH_SIZE:
+                try:
+                    entries.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._append_entries(entries)
+            finally:
+                for _ in entries:
+                    self._write_queue.task_done()
+
+    def _append_entries(self, entries: list[dict]):
         try:
             history = self._load_raw_history()
-            history.append(entry)
+            history.extend(entries)
             with open(self.filepath, "w", encoding="utf-8") as f:
-                json.dump(history, f, indent=4, ensure_ascii=False)
+                # History is machine-read only, so write it compact
+                json.dump(history, f, ensure_ascii=False, separators=(",", ":"))
         except IOError as e:
-            logging.error(f"IOError saving message to {self.filepath}: {e}")
+            logger.error("IOError saving messages to %s: %s", self.filepath, e)
         except Exception as e:
-            logging.error(f"Unexpected error saving message: {e}", exc_info=True)
+            logger.error("Unexpected error saving messages: %s", e, exc_info=True)
 
     def load_history(self) -> list[dict]:
-        logging.info(f"Loading history from {self.filepath}")
+        logger.info("Loading history from %s", self.filepath)
+        self.flush() # Include messages still waiting in the write queue
         return self._load_raw_history()
 
     def load_conversation(self) -> list[dict]:
         """Loads the full conversation history. Alias for load_history."""
         return self.load_history()
 
+    def history_mtime(self):
+        """Returns (mtime_ns, size) of the history file, or None if it doesn't exist.
+
+        Callers can compare this with a previous value to skip reloading an unchanged history.
+        """
+        self.flush() # Pending writes would change the file
+        try:
+            stat = self.filepath.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
     def _load_raw_history(self) -> list[dict]:
         if not self.filepath.exists():
-            logging.warning(f"History file {self.filepath} not found. Returning empty history.")
+            logger.warning("History file %s not found. Returning empty history.", self.filepath)
             return []
         try:
             with open(self.filepath, "r", encoding="utf-8") as f:
@@ -177,18 +254,29 @@ class LocalStorageManager:
                 if not isinstance(history, list): return []
                 return history
         except (json.JSONDecodeError, IOError) as e:
-            logging.error(f"Error loading/parsing history from {self.filepath}: {e}. Returning empty history.")
+            logger.error("Error loading/parsing history from %s: %s. Returning empty history.", self.filepath, e)
             return []
         except Exception as e:
-            logging.error(f"Unexpected error loading history: {e}", exc_info=True)
+            logger.error("Unexpected error loading history: %s", e, exc_info=True)
             return []
 
     def authenticate(self):
-        logging.info("Local storage does not require authentication.")
+        logger.info("Local storage does not require authentication.")
         return True
 
 # --- Google Drive Storage Manager ---
 SCOPES = ["https://www.googleapis.com/auth/drive.file"]
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+HTTP_TIMEOUT_SECONDS = 10
+# An OAuth flow the user abandons (browser tab ignored or closed) fails after this long,
+# releasing the auth lock so saves, loads and a fresh "Authenticate" click can proceed
+OAUTH_TIMEOUT_SECONDS = 300
+# Drive's limit for simple (non-resumable) media uploads
+SIMPLE_UPLOAD_MAX_BYTES = 5 * 1024 * 1024
+
+def _escape_query_value(value: str) -> str:
+    """Escapes a string for use inside a quoted Drive `files().list` query term."""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
 
 class GoogleDriveStorageManager:
     def __init__(self, credentials_file="credentials.json", token_file="token.json", filename="jarvis_chat_history.json", folder_name="Jarvis-Core History"):
@@ -206,36 +294,74 @@ class GoogleDriveStorageManager:
         self.filename = filename
         self.folder_name = folder_name
         self.service = None
+        self._http = None
+        self._folder_id = None
         self.file_id = None
-        logging.info(f"Initializing GoogleDriveStorageManager. Credentials: {self.credentials_path}, Token: {self.token_path}")
+        # Local mirror of the Drive history so saves don't re-download the file. It is
+        # refreshed whenever the file's Drive version differs from the one it was read at.
+        self._cached_history = None
+        self._cached_version = None
+        self._history_lock = threading.Lock() # Guards the mirror across load and save threads
+        # Authentication is deferred until first use (or a background warm-up)
+        # Reentrant: _ensure_authenticated holds it while calling authenticate()
+        self._auth_lock = threading.RLock()
+        self._auth_attempted = False
+        logger.info("Initializing GoogleDriveStorageManager. Credentials: %s, Token: %s", self.credentials_path, self.token_path)
+
+    def is_authenticated(self) -> bool:
+        """Returns True once the Drive service is built and the history file is resolved."""
+        return self.service is not None and self.file_id is not None
+
+    def _ensure_authenticated(self) -> bool:
+        """Authenticates on first use, sharing one attempt between concurrent callers.
+
+        A failed automatic attempt is not retried, so a cancelled OAuth flow does not
+        reopen on every save. Call `authenticate()` explicitly to try again.
+        """
+        if self.is_authenticated():
+            return True
+        with self._auth_lock:
+            if not self.is_authenticated() and not self._auth_attempted:
+                self._auth_attempted = True
+                self.authenticate()
+        return self.is_authenticated()
 
     def authenticate(self, force_reauth=False) -> bool:
+        """Authenticates with Google Drive, running at most one OAuth flow at a time.
+
+        An explicit call (e.g. from the Settings window) waits for an in-progress
+        background attempt instead of starting a second local server.
+        """
+        with self._auth_lock:
+            return self._authenticate(force_reauth)
+
+    def _authenticate(self, force_reauth=False) -> bool:
         creds = None
         if not force_reauth and self.token_path.exists():
             try:
                 with open(self.token_path, "r", encoding="utf-8") as token:
                     creds_info = json.load(token)
                     creds = Credentials.from_authorized_user_info(creds_info, SCOPES)
-                logging.info("Loaded existing Google Drive token from JSON.")
+                logger.info("Loaded existing Google Drive token from JSON.")
             except (json.JSONDecodeError, IOError, ValueError) as e:
-                logging.warning(f"Error loading token file {self.token_path}: {e}. Will re-authenticate.")
+                logger.warning("Error loading token file %s: %s. Will re-authenticate.", self.token_path, e)
                 creds = None
             except Exception as e:
-                logging.error(f"Unexpected error loading token: {e}", exc_info=True)
+                logger.error("Unexpected error loading token: %s", e, exc_info=True)
                 creds = None
 
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
                 try:
-                    logging.info("Refreshing expired Google Drive token.")
+                    logger.info("Refreshing expired Google Drive token.")
                     creds.refresh(Request())
                 except Exception as e:
-                    logging.error(f"Failed to refresh token: {e}. Need full re-authentication.")
+                    logger.error("Failed to refresh token: %s. Need full re-authentication.", e)
                     creds = None
             else:
-                logging.info("No valid Google Drive token found or re-auth forced. Starting OAuth flow.")
+                logger.info("No valid Google Drive token found or re-auth forced. Starting OAuth flow.")
                 if not self.credentials_path.exists():
-                    logging.error(f"Credentials file not found at {self.credentials_path}. Cannot authenticate.")
+                    logger.error("Credentials file not found at %s. Cannot authenticate.", self.credentials_path)
                     print(f"ERROR: Google Drive credentials file ({self.credentials_path}) not found.")
                     print("Please download your OAuth 2.0 Client ID credentials and place the file correctly.")
                     return False
@@ -243,11 +369,11 @@ class GoogleDriveStorageManager:
                     flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
                     print("\n-- Google Drive Authentication Required --")
                     print("Please follow the instructions in the browser/console to authorize Jarvis-Core.")
-                    creds = flow.run_local_server(port=0)
+                    creds = flow.run_local_server(port=0, timeout_seconds=OAUTH_TIMEOUT_SECONDS)
                     print("-- Authentication Successful --\n")
-                    logging.info("OAuth flow completed successfully.")
+                    logger.info("OAuth flow completed successfully.")
                 except Exception as e:
-                    logging.error(f"Error during OAuth flow: {e}", exc_info=True)
+                    logger.error("Error during OAuth flow: %s", e, exc_info=True)
                     print(f"ERROR: Google Drive authentication failed: {e}")
                     return False
             if creds:
@@ -255,88 +381,119 @@ class GoogleDriveStorageManager:
                     with open(self.token_path, "w", encoding="utf-8") as token:
                         token_data = json.loads(creds.to_json())
                         json.dump(token_data, token, indent=4)
-                    logging.info(f"Saved new Google Drive token to {self.token_path}")
+                    logger.info("Saved new Google Drive token to %s", self.token_path)
                 except (IOError, json.JSONDecodeError) as e:
-                    logging.error(f"Error saving token: {e}", exc_info=True)
+                    logger.error("Error saving token: %s", e, exc_info=True)
                 except Exception as e:
-                    logging.error(f"Unexpected error saving token: {e}", exc_info=True)
+                    logger.error("Unexpected error saving token: %s", e, exc_info=True)
 
         if creds:
             try:
-                self.service = build("drive", "v3", credentials=creds)
-                logging.info("Google Drive service built successfully.")
+                # Reuse one authorized connection for every Drive request, and build the
+                # client from the discovery document bundled with google-api-python-client
+                # rather than fetching it over the network on every start.
+                self._http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS))
+                self.service = build("drive", "v3", http=self._http, cache_discovery=False, static_discovery=True)
+                logger.info("Google Drive service built successfully.")
                 self._ensure_file_exists() # Ensure file exists after successful auth
                 return True
             except Exception as e:
-                logging.error(f"Failed to build Google Drive service: {e}", exc_info=True)
+                logger.error("Failed to build Google Drive service: %s", e, exc_info=True)
                 self.service = None
                 return False
         else:
-            logging.error("Failed to obtain Google Drive credentials.")
+            logger.error("Failed to obtain Google Drive credentials.")
             self.service = None
             return False
 
-    def _find_or_create_folder(self):
+    def _find_or_create_folder(self, candidates=None):
+        """Returns the history folder ID, creating the folder if needed.
+
+        Args:
+            candidates: Optional list of Drive file resources from an earlier
+                `files().list` call to search before querying Drive again.
+        """
         if not self.service:
             return None
+        if self._folder_id:
+            return self._folder_id # Folder IDs are stable, look it up once per process
         try:
-            query = f"mimeType=\'application/vnd.google-apps.folder\' and name=\'{self.folder_name}\' and trashed=false"
-            response = self.service.files().list(q=query, spaces="drive", fields="files(id, name)").execute()
-            folders = response.get("files", [])
+            if candidates is None:
+                query = f"mimeType=\'{FOLDER_MIME_TYPE}\' and name=\'{_escape_query_value(self.folder_name)}\' and trashed=false"
+                response = self.service.files().list(q=query, spaces="drive", fields="files(id, name, mimeType)").execute()
+                candidates = response.get("files", [])
+            folders = [f for f in candidates if f.get("mimeType") == FOLDER_MIME_TYPE and f.get("name") == self.folder_name]
 
             if folders:
-                folder_id = folders[0].get("id")
-                logging.info(f"Found existing folder '{self.folder_name}' with ID: {folder_id}")
-                return folder_id
+                self._folder_id = folders[0].get("id")
+                logger.info("Found existing folder '%s' with ID: %s", self.folder_name, self._folder_id)
+                return self._folder_id
             else:
-                logging.info(f"Folder '{self.folder_name}' not found. Creating...")
+                logger.info("Folder '%s' not found. Creating...", self.folder_name)
                 file_metadata = {
                     "name": self.folder_name,
-                    "mimeType": "application/vnd.google-apps.folder"
+                    "mimeType": FOLDER_MIME_TYPE
                 }
                 folder = self.service.files().create(body=file_metadata, fields="id").execute()
-                folder_id = folder.get("id")
-                logging.info(f"Created folder '{self.folder_name}' with ID: {folder_id}")
-                return folder_id
+                self._folder_id = folder.get("id")
+                logger.info("Created folder '%s' with ID: %s", self.folder_name, self._folder_id)
+                return self._folder_id
         except Exception as e:
-            logging.error(f"Error finding or creating folder '{self.folder_name}': {e}", exc_info=True)
+            logger.error("Error finding or creating folder '%s': %s", self.folder_name, e, exc_info=True)
             return None
 
     def _ensure_file_exists(self):
         if not self.service:
             return
-        folder_id = self._find_or_create_folder()
+        if self.file_id:
+            return # Already resolved earlier in this process (e.g. token refresh / re-auth)
+
+        try:
+            # Look up the folder and the history file in a single list call
+            query = (f"(mimeType=\'{FOLDER_MIME_TYPE}\' and name=\'{_escape_query_value(self.folder_name)}\' and trashed=false)"
+                     f" or (name=\'{_escape_query_value(self.filename)}\' and trashed=false)")
+            response = self.service.files().list(q=query, spaces="drive", fields="files(id, name, mimeType, parents)").execute()
+            candidates = response.get("files", [])
+        except Exception as e:
+            logger.error("Error listing Google Drive files: %s", e, exc_info=True)
+            self.file_id = None
+            return
+
+        folder_id = self._find_or_create_folder(candidates)
         if not folder_id:
-            logging.error("Cannot ensure file exists without a valid folder ID.")
+            logger.error("Cannot ensure file exists without a valid folder ID.")
             return
 
         try:
-            query = f"name=\'{self.filename}\' and \'{folder_id}\' in parents and trashed=false"
-            response = self.service.files().list(q=query, spaces="drive", fields="files(id, name)").execute()
-            files = response.get("files", [])
+            files = [f for f in candidates
+                     if f.get("name") == self.filename
+                     and f.get("mimeType") != FOLDER_MIME_TYPE
+                     and folder_id in f.get("parents", [])]
 
+            self._cached_history = None # File may have changed, refresh the mirror on next use
+            self._cached_version = None
             if files:
                 self.file_id = files[0].get("id")
-                logging.info(f"Found existing history file '{self.filename}' with ID: {self.file_id}")
+                logger.info("Found existing history file '%s' with ID: %s", self.filename, self.file_id)
             else:
-                logging.info(f"History file '{self.filename}' not found in folder. Creating...")
+                logger.info("History file '%s' not found in folder. Creating...", self.filename)
                 file_metadata = {
                     "name": self.filename,
                     "parents": [folder_id]
                 }
-                media = MediaFileUpload(io.BytesIO(b"[]"), mimetype="application/json", resumable=True)
+                media = MediaInMemoryUpload(b"[]", mimetype="application/json", resumable=False)
                 file = self.service.files().create(body=file_metadata,
                                                media_body=media,
                                                fields="id").execute()
                 self.file_id = file.get("id")
-                logging.info(f"Created history file '{self.filename}' with ID: {self.file_id}")
+                logger.info("Created history file '%s' with ID: %s", self.filename, self.file_id)
         except Exception as e:
-            logging.error(f"Error finding or creating file '{self.filename}': {e}", exc_info=True)
+            logger.error("Error finding or creating file '%s': %s", self.filename, e, exc_info=True)
             self.file_id = None
 
     def save_message(self, sender: str, message: str):
-        if not self.service or not self.file_id:
-            logging.error("Google Drive service not available or file ID not set. Cannot save message.")
+        if not self._ensure_authenticated():
+            logger.error("Google Drive service not available or file ID not set. Cannot save message.")
             return
         entry = {
             "timestamp": datetime.now().isoformat(),
@@ -344,22 +501,70 @@ class GoogleDriveStorageManager:
             "message": message
         }
         try:
-            history = self._download_history()
-            history.append(entry)
-            updated_content = json.dumps(history, indent=4, ensure_ascii=False).encode("utf-8")
-            media = MediaFileUpload(io.BytesIO(updated_content), mimetype="application/json", resumable=True)
-            self.service.files().update(fileId=self.file_id, media_body=media).execute()
+            with self._history_lock:
+                history = self._get_cached_history()
+                if history is None:
+                    # Uploading now would replace the whole Drive file with just this entry
+                    logger.error("Could not load existing history from Google Drive. Not saving message.")
+                    return
+                history = history + [entry] # Only update the mirror once the upload succeeds
+                updated_content = json.dumps(history, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                # Simple uploads are limited to 5 MB; larger histories need a resumable upload
+                media = MediaInMemoryUpload(updated_content, mimetype="application/json",
+                                            resumable=len(updated_content) > SIMPLE_UPLOAD_MAX_BYTES)
+                result = self.service.files().update(fileId=self.file_id, media_body=media, fields="version").execute()
+                self._cached_history = history
+                self._cached_version = result.get("version")
         except Exception as e:
-            logging.error(f"Error saving message to Google Drive: {e}", exc_info=True)
+            logger.error("Error saving message to Google Drive: %s", e, exc_info=True)
 
     def load_history(self) -> list[dict]:
-        logging.info(f"Loading history from Google Drive file ID: {self.file_id}")
-        if not self.service or not self.file_id:
-            logging.error("Google Drive service not available or file ID not set. Cannot load history.")
+        logger.info("Loading history from Google Drive file ID: %s", self.file_id)
+        if not self._ensure_authenticated():
+            logger.error("Google Drive service not available or file ID not set. Cannot load history.")
+            return []
+        with self._history_lock:
+            history = self._get_cached_history()
+        if history is None:
             return []
-        return self._download_history()
+        return list(history)
+
+    def load_conversation(self) -> list[dict]:
+        """Loads the full conversation history. Alias for load_history."""
+        return self.load_history()
+
+    def history_mtime(self):
+        """Always None: Drive has no cheap change check, so callers reload (served from the local mirror)."""
+        return None
+
+    def _get_cached_history(self):
+        """Returns the local mirror of the Drive history, downloading it if it is missing or stale.
+
+        Checks the file's Drive version first (a metadata-only request) so writes from another
+        machine or instance are picked up. Returns None if the download fails; the mirror is
+        only set from a successful download so a transient error can't make later saves
+        overwrite the file. Callers must hold _history_lock.
+        """
+        version = self._remote_version()
+        if self._cached_history is not None and version is not None and version == self._cached_version:
+            return self._cached_history
+        history = self._download_history()
+        if history is None:
+            return None
+        self._cached_history = history
+        self._cached_version = version
+        return history
+
+    def _remote_version(self):
+        """Returns the history file's current Drive version, or None if it can't be fetched."""
+        try:
+            return self.service.files().get(fileId=self.file_id, fields="version").execute().get("version")
+        except Exception as e:
+            logger.warning("Could not fetch Google Drive history version: %s", e)
+            return None
 
-    def _download_history(self) -> list[dict]:
+    def _download_history(self):
+        """Downloads and parses the Drive history. Returns None on any error."""
         try:
             request = self.service.files().get_media(fileId=self.file_id)
             fh = io.BytesIO()
@@ -367,15 +572,17 @@ class GoogleDriveStorageManager:
             done = False
             while done is False:
                 status, done = downloader.next_chunk()
-            fh.seek(0)
-            content = fh.read().decode("utf-8")
+            # json.loads detects and validates UTF-8 itself, so parse the raw bytes
+            content = fh.getvalue()
             if not content.strip(): return []
             history = json.loads(content)
-            if not isinstance(history, list): return []
+            if not isinstance(history, list):
+                logger.error("History file on Google Drive is not a JSON list.")
+                return None
             return history
         except (json.JSONDecodeError, Exception) as e:
-            logging.error(f"Error downloading/parsing history from Google Drive: {e}", exc_info=True)
-            return []
+            logger.error("Error downloading/parsing history from Google Drive: %s", e, exc_info=True)
+            return None
 
 # --- Unified Storage Factory ---
 
@@ -398,7 +605,7 @@ def initialize_storage_manager(force_reinit=False):
     mode = settings.get("storage_mode", "local")
     history_filename = settings.get("history_filename", "jarvis_chat_history.json")
     
-    logging.info(f"Initializing storage manager in '{mode}' mode.")
+    logger.info("Initializing storage manager in '%s' mode.", mode)
 
     if mode == "google_drive":
         creds_file = settings.get("google_drive_credentials_file", "credentials.json")
@@ -410,8 +617,8 @@ def initialize_storage_manager(force_reinit=False):
             filename=history_filename,
             folder_name=folder_name
         )
-        # Trigger authentication immediately upon initialization for GDrive
-        auth_thread = threading.Thread(target=_current_storage_manager.authenticate, daemon=True)
+        # Warm up authentication in the background; the first save/load waits for it if still running
+        auth_thread = threading.Thread(target=_current_storage_manager._ensure_authenticated, daemon=True)
         auth_thread.start()
         
     else: # Default to local
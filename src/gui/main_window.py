@@ -6,13 +6,18 @@ import tkinter.messagebox as messagebox
 import tkinter.filedialog as filedialog
 import threading
 import queue
-import logging
+import functools
+import importlib.util
+import time
+from collections import deque
+import json
+import subprocess
+import sys
 from pathlib import Path
-import subprocess # Added for running builder script
-import sys # Added for getting python executable
+from dataclasses import dataclass
+import logging
 
-# Import backend components
-from src.core.orchestrator import Orchestrator, RAG_ENABLED # Import RAG_ENABLED flag
+# Import backend components (the Orchestrator and its LLM stack are imported lazily by the restart worker)
 from src.core.storage_manager import get_storage_manager, save_settings, load_settings, GoogleDriveStorageManager, initialize_storage_manager
 
 # Import SecureStorage
@@ -22,20 +27,93 @@ except ImportError:
     logging.error("Could not import SecureStorage. API key functionality will be limited.")
     SecureStorage = None
 
-# Attempt to import RAG builder function for UI integration
-try:
-    # We don't actually call it directly, but check if module exists
-    import src.rag.rag_builder
-    RAG_BUILDER_AVAILABLE = RAG_ENABLED # Assume builder is available if RAG deps are met
-except ImportError as e:
-    logging.error(f"Failed to import necessary LangChain components for RAG building: {e}")
-    RAG_BUILDER_AVAILABLE = False
+# Top-level packages rag_builder needs (LangChain loaders/splitter, HuggingFace embeddings and their sentence-transformers backend, Chroma)
+_RAG_REQUIRED_PACKAGES = ("langchain", "langchain_community", "langchain_huggingface", "sentence_transformers", "chromadb")
+
+@functools.lru_cache(maxsize=None)
+def _rag_available():
+    """Checks that the RAG builder's dependencies are installed without importing them."""
+    missing = [name for name in _RAG_REQUIRED_PACKAGES if importlib.util.find_spec(name) is None]
+    if missing:
+        logging.warning(f"RAG building unavailable; missing packages: {', '.join(missing)}")
+    return not missing
+
+# LLM providers selectable in the Settings window
+_AVAILABLE_PROVIDERS = ("local", "openai", "deepseek")
+
+# Oldest chat lines are trimmed once the display exceeds this many lines
+MAX_CHAT_LINES = 2000
+CHAT_TRIM_CHECK_INTERVAL = 20 # Inserts between line-count checks
+# Only the most recent messages of a loaded history are rendered; the full history stays in storage
+HISTORY_DISPLAY_MESSAGES = 200
+
+# Streamed tokens are posted to the UI in batches of this many chunks, or at least every ~16ms (one frame)
+STREAM_BATCH_CHUNKS = 8
+STREAM_BATCH_SECONDS = 0.016
+# While this many messages are still waiting for the UI, further tokens are coalesced in the worker
+MAX_PENDING_MESSAGES = 256
+
+# Virtual event generated by worker threads after posting to MainWindow.message_queue
+QUEUE_EVENT = "<<QueueMessage>>"
+
+# (label, ProviderState field, placeholder) for the plain text rows of each provider's settings frame
+_PROVIDER_FIELD_ROWS = (
+    ("Model:", "model", None),
+    ("Endpoint (Optional):", "endpoint", "Default API endpoint"),
+)
+
+@dataclass(slots=True)
+class ProviderState:
+    """Variables and widgets of one provider's frame in the API Providers tab."""
+    enabled: ctk.BooleanVar
+    model: ctk.StringVar
+    endpoint: ctk.StringVar
+    key_entry_var: ctk.StringVar
+    key_status_var: ctk.StringVar
+    key_entry: ctk.CTkEntry = None
+    clear_key_button: ctk.CTkButton = None
+
+# Non-blocking status bar notifications used instead of success dialogs
+TOAST_DURATION_MS = 4000
+_TOAST_COLORS = {"ok": "green", "info": "gray", "error": "red"}
+
+# Project root (src/gui/main_window.py -> repo root); the RAG builder subprocess runs from here
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+# Separator between the level and the message in rag_builder's log format
+RAG_BUILDER_LOG_TAG = " - RAG Builder - "
 
-# Configure basic logging for the GUI
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - GUI - %(message)s")
+# Longest RAG builder log line shown in the Settings status label
+RAG_STATUS_MAX_CHARS = 90
+RAG_STATUS_MIN_INTERVAL = 0.2 # Seconds between status label updates during a build
 
-# Define project root relative to this file (src/gui/main_window.py)
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+# Longest the window waits on close for pending conversation saves (e.g. a Drive save stuck on OAuth)
+SAVE_FLUSH_TIMEOUT_SECONDS = 5
+
+class _DaemonWorker:
+    """Runs submitted jobs one at a time on a single reused daemon thread.
+
+    Unlike a ThreadPoolExecutor's workers, queued or running jobs never keep the process alive after the window closes.
+    """
+    def __init__(self, name):
+        self._jobs = queue.Queue()
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def submit(self, fn, *args):
+        self._jobs.put((fn, args))
+
+    def flush(self, timeout):
+        """Waits up to timeout seconds for previously submitted jobs; returns True if they all finished."""
+        done = threading.Event()
+        self.submit(done.set) # Jobs run in order, so this runs after everything already queued
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            fn, args = self._jobs.get()
+            try:
+                fn(*args)
+            except Exception:
+                logging.exception("Background job failed:")
 
 class SettingsWindow(ctk.CTkToplevel):
     """Window for configuring application settings."""
@@ -46,10 +124,19 @@ class SettingsWindow(ctk.CTkToplevel):
         self.geometry("600x700") # Adjusted size
         self.transient(parent)
         self.grab_set()
+        # Closing only hides the window so MainWindow can reuse it on the next open
+        self.protocol("WM_DELETE_WINDOW", self.hide)
+        # Reused daemon thread for key-status checks; the window itself is reused too
+        self._key_status_worker = _DaemonWorker("tarvis-settings")
+
+        # Shared by every provider's title label
+        self._bold_font = ctk.CTkFont(weight="bold")
 
         self.settings = load_settings()
         if "api_providers" not in self.settings:
             self.settings["api_providers"] = {}
+        # Serialized copy of what is on disk, used to skip no-op saves
+        self._saved_settings_snapshot = json.dumps(self.settings, sort_keys=True)
 
         # --- Variables --- 
         self.storage_mode_var = ctk.StringVar(value=self.settings.get("storage_mode", "local"))
@@ -60,17 +147,14 @@ class SettingsWindow(ctk.CTkToplevel):
         self.rag_build_status_var = ctk.StringVar(value="")
         self.gdrive_auth_status_var = ctk.StringVar(value="") # For GDrive auth feedback
 
-        self.provider_vars = {}
-        self.provider_key_entry_vars = {}
-        self.provider_key_status_vars = {}
-        self.provider_widgets = {}
+        self.providers = {} # provider name -> ProviderState, filled when the API Providers tab is built
 
         # --- Title ---
         title_label = ctk.CTkLabel(self, text="Application Settings", font=ctk.CTkFont(size=16, weight="bold"))
         title_label.pack(pady=(10, 15))
 
         # --- Create TabView ---
-        self.tab_view = ctk.CTkTabview(self)
+        self.tab_view = ctk.CTkTabview(self, command=self._on_tab_change)
         self.tab_view.pack(pady=10, padx=20, fill="both", expand=True)
         self.tab_view.add("Storage")
         self.tab_view.add("Model & Prompt")
@@ -103,8 +187,8 @@ class SettingsWindow(ctk.CTkToplevel):
         local_path_entry_frame.grid_columnconfigure(0, weight=1)
         self.local_path_entry = ctk.CTkEntry(local_path_entry_frame, textvariable=self.local_storage_path_var, placeholder_text="Default: ~/.jarvis-core/history")
         self.local_path_entry.grid(row=0, column=0, sticky="ew", padx=(0, 5))
-        local_path_browse_button = ctk.CTkButton(local_path_entry_frame, text="Browse...", width=80, command=self.browse_directory)
-        local_path_browse_button.grid(row=0, column=1, sticky="e")
+        self.local_path_browse_button = ctk.CTkButton(local_path_entry_frame, text="Browse...", width=80, command=self.browse_directory)
+        self.local_path_browse_button.grid(row=0, column=1, sticky="e")
 
         # --- Model & Prompt Tab ---
         model_tab = self.tab_view.tab("Model & Prompt")
@@ -132,27 +216,83 @@ class SettingsWindow(ctk.CTkToplevel):
         prompt_path_browse_button = ctk.CTkButton(prompt_path_entry_frame, text="Browse...", width=80, command=self.browse_prompt_file)
         prompt_path_browse_button.grid(row=0, column=1, sticky="e")
 
-        # --- API Providers Tab --- 
+        # API Providers and RAG tabs are built the first time they are shown
+        self._lazy_tab_builders = {
+            "API Providers": self._build_api_providers_tab,
+            "RAG": self._build_rag_tab,
+        }
+
+        # --- Buttons Frame (Bottom) ---
+        button_frame = ctk.CTkFrame(self, fg_color="transparent")
+        button_frame.pack(pady=(15, 10), side="bottom", fill="x", padx=20)
+        button_frame.grid_columnconfigure((0, 1), weight=1)
+
+        self.save_button = ctk.CTkButton(button_frame, text="Save & Restart Backend", command=self.save_and_close)
+        self.save_button.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
+
+        self.cancel_button = ctk.CTkButton(button_frame, text="Cancel", command=self.hide, fg_color="gray")
+        self.cancel_button.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
+
+        # Initial state update
+        self.toggle_local_path_entry()
+
+    def hide(self):
+        """Hides the window instead of destroying it; see MainWindow.open_settings."""
+        self.grab_release()
+        self.withdraw()
+
+    def _reload_from_disk(self):
+        """Resets the form variables from the saved settings without rebuilding any widgets."""
+        self.settings = load_settings()
+        if "api_providers" not in self.settings:
+            self.settings["api_providers"] = {}
+        # Serialized copy of what is on disk, used to skip no-op saves
+        self._saved_settings_snapshot = json.dumps(self.settings, sort_keys=True)
+
+        self.storage_mode_var.set(self.settings.get("storage_mode", "local"))
+        self.local_storage_path_var.set(self.settings.get("local_storage_path") or "")
+        self.llm_model_path_var.set(self.settings.get("llm_model_path") or "")
+        self.system_prompt_path_var.set(self.settings.get("system_prompt_path") or "")
+        self.active_llm_provider_var.set(self.settings.get("active_llm_provider", "local"))
+
+        for provider_name, state in self.providers.items():
+            config = self.settings["api_providers"].get(provider_name, {})
+            state.enabled.set(config.get("enabled", False))
+            state.model.set(config.get("model", ""))
+            state.endpoint.set(config.get("endpoint", "") or "")
+            state.key_entry_var.set("")
+
+        self.toggle_local_path_entry()
+        if self.providers:
+            self.update_key_status_labels()
+
+    def _on_tab_change(self):
+        """Builds a lazily-created tab the first time it is selected."""
+        builder = self._lazy_tab_builders.pop(self.tab_view.get(), None)
+        if builder:
+            builder()
+
+    def _build_api_providers_tab(self):
         api_tab = self.tab_view.tab("API Providers")
         active_provider_frame = ctk.CTkFrame(api_tab)
         active_provider_frame.pack(pady=10, padx=10, fill="x")
         active_provider_label = ctk.CTkLabel(active_provider_frame, text="Active LLM Provider:")
         active_provider_label.pack(side="left", padx=(10, 5))
-        available_providers = ["local", "openai", "deepseek"]
-        provider_dropdown = ctk.CTkOptionMenu(active_provider_frame, variable=self.active_llm_provider_var, values=available_providers)
+        provider_dropdown = ctk.CTkOptionMenu(active_provider_frame, variable=self.active_llm_provider_var, values=list(_AVAILABLE_PROVIDERS))
         provider_dropdown.pack(side="left", padx=(0, 10), fill="x", expand=True)
 
-        sep = tk.Frame(api_tab, height=1, bg="gray70")
+        sep = ctk.CTkFrame(api_tab, height=2, corner_radius=0, fg_color="gray70")
         sep.pack(fill="x", padx=10, pady=10)
 
         scrollable_frame = ctk.CTkScrollableFrame(api_tab, label_text="Provider Settings")
         scrollable_frame.pack(pady=5, padx=10, fill="both", expand=True)
 
-        default_providers = load_settings().get("api_providers", {})
+        default_providers = self.settings.get("api_providers", {})
         for provider_name, default_config in default_providers.items():
             self.create_provider_settings_ui(scrollable_frame, provider_name, default_config)
+        self.update_key_status_labels()
 
-        # --- RAG Tab --- (New)
+    def _build_rag_tab(self):
         rag_tab = self.tab_view.tab("RAG")
         rag_frame = ctk.CTkFrame(rag_tab)
         rag_frame.pack(pady=20, padx=20, fill="x")
@@ -166,68 +306,49 @@ class SettingsWindow(ctk.CTkToplevel):
         rag_status_label = ctk.CTkLabel(rag_frame, textvariable=self.rag_build_status_var, text_color="gray")
         rag_status_label.pack(pady=5)
 
-        if not RAG_BUILDER_AVAILABLE:
+        if not _rag_available():
             self.rag_build_button.configure(state=ctk.DISABLED, text="Build RAG Index (Dependencies Missing)")
             self.rag_build_status_var.set("Install chromadb and sentence-transformers/langchain-huggingface to enable RAG.")
         else:
              self.rag_build_status_var.set("Click button to build index from \'knowledge_base\' directory.")
 
-        # --- Buttons Frame (Bottom) ---
-        button_frame = ctk.CTkFrame(self, fg_color="transparent")
-        button_frame.pack(pady=(15, 10), side="bottom", fill="x", padx=20)
-        button_frame.grid_columnconfigure((0, 1), weight=1)
-
-        self.save_button = ctk.CTkButton(button_frame, text="Save & Restart Backend", command=self.save_and_close)
-        self.save_button.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
-
-        self.cancel_button = ctk.CTkButton(button_frame, text="Cancel", command=self.destroy, fg_color="gray")
-        self.cancel_button.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
-
-        # Initial state update
-        self.toggle_local_path_entry()
-        self.update_key_status_labels()
-
     def create_provider_settings_ui(self, parent_frame, provider_name, config):
-        provider_frame = ctk.CTkFrame(parent_frame)
+        Frame, Label, Entry, Switch, Button = ctk.CTkFrame, ctk.CTkLabel, ctk.CTkEntry, ctk.CTkSwitch, ctk.CTkButton
+        provider_frame = Frame(parent_frame)
         provider_frame.pack(pady=10, padx=5, fill="x")
         provider_frame.grid_columnconfigure(1, weight=1)
 
-        self.provider_vars[provider_name] = {
-            "enabled": ctk.BooleanVar(value=self.settings["api_providers"].get(provider_name, {}).get("enabled", False)),
-            "model": ctk.StringVar(value=self.settings["api_providers"].get(provider_name, {}).get("model", config.get("model", ""))),
-            "endpoint": ctk.StringVar(value=self.settings["api_providers"].get(provider_name, {}).get("endpoint", config.get("endpoint", "") or "")),
-        }
-        self.provider_key_entry_vars[provider_name] = ctk.StringVar()
-        self.provider_key_status_vars[provider_name] = ctk.StringVar(value="Checking...")
-        self.provider_widgets[provider_name] = {}
+        cfg = self.settings["api_providers"].get(provider_name) or {}
+        state = self.providers[provider_name] = ProviderState(
+            enabled=ctk.BooleanVar(value=cfg.get("enabled", False)),
+            model=ctk.StringVar(value=cfg.get("model", config.get("model", ""))),
+            endpoint=ctk.StringVar(value=cfg.get("endpoint", config.get("endpoint", "") or "")),
+            key_entry_var=ctk.StringVar(),
+            key_status_var=ctk.StringVar(value="Checking..."),
+        )
 
-        title_label = ctk.CTkLabel(provider_frame, text=f"{provider_name.capitalize()} Settings:", font=ctk.CTkFont(weight="bold"))
+        title_label = Label(provider_frame, text=f"{provider_name.capitalize()} Settings:", font=self._bold_font)
         title_label.grid(row=0, column=0, padx=10, pady=(5, 2), sticky="w")
-        enable_switch = ctk.CTkSwitch(provider_frame, text="Enable", variable=self.provider_vars[provider_name]["enabled"])
+        enable_switch = Switch(provider_frame, text="Enable", variable=state.enabled)
         enable_switch.grid(row=0, column=1, padx=10, pady=(5, 2), sticky="e")
 
-        model_label = ctk.CTkLabel(provider_frame, text="Model:")
-        model_label.grid(row=1, column=0, padx=10, pady=2, sticky="w")
-        model_entry = ctk.CTkEntry(provider_frame, textvariable=self.provider_vars[provider_name]["model"])
-        model_entry.grid(row=1, column=1, padx=10, pady=2, sticky="ew")
+        for row, (label_text, var_name, placeholder) in enumerate(_PROVIDER_FIELD_ROWS, start=1):
+            Label(provider_frame, text=label_text).grid(row=row, column=0, padx=10, pady=2, sticky="w")
+            Entry(provider_frame, textvariable=getattr(state, var_name), placeholder_text=placeholder).grid(row=row, column=1, padx=10, pady=2, sticky="ew")
 
-        endpoint_label = ctk.CTkLabel(provider_frame, text="Endpoint (Optional):")
-        endpoint_label.grid(row=2, column=0, padx=10, pady=2, sticky="w")
-        endpoint_entry = ctk.CTkEntry(provider_frame, textvariable=self.provider_vars[provider_name]["endpoint"], placeholder_text="Default API endpoint")
-        endpoint_entry.grid(row=2, column=1, padx=10, pady=2, sticky="ew")
+        key_row = len(_PROVIDER_FIELD_ROWS) + 1
+        key_label = Label(provider_frame, text="API Key:")
+        key_label.grid(row=key_row, column=0, padx=10, pady=2, sticky="w")
+        key_entry = Entry(provider_frame, textvariable=state.key_entry_var, show="*", placeholder_text="Enter new key to save")
+        key_entry.grid(row=key_row, column=1, padx=10, pady=2, sticky="ew")
+        state.key_entry = key_entry
 
-        key_label = ctk.CTkLabel(provider_frame, text="API Key:")
-        key_label.grid(row=3, column=0, padx=10, pady=2, sticky="w")
-        key_entry = ctk.CTkEntry(provider_frame, textvariable=self.provider_key_entry_vars[provider_name], show="*", placeholder_text="Enter new key to save")
-        key_entry.grid(row=3, column=1, padx=10, pady=2, sticky="ew")
-        self.provider_widgets[provider_name]["key_entry"] = key_entry
+        key_status_label = Label(provider_frame, textvariable=state.key_status_var, text_color="gray")
+        key_status_label.grid(row=key_row + 1, column=1, padx=10, pady=(0, 5), sticky="w")
 
-        key_status_label = ctk.CTkLabel(provider_frame, textvariable=self.provider_key_status_vars[provider_name], text_color="gray")
-        key_status_label.grid(row=4, column=1, padx=10, pady=(0, 5), sticky="w")
-
-        clear_key_button = ctk.CTkButton(provider_frame, text="Clear Stored Key", width=120, fg_color="#d9534f", hover_color="#c9302c", command=lambda p=provider_name: self.clear_stored_key(p))
-        clear_key_button.grid(row=4, column=0, padx=10, pady=(0, 5), sticky="w")
-        self.provider_widgets[provider_name]["clear_key_button"] = clear_key_button
+        clear_key_button = Button(provider_frame, text="Clear Stored Key", width=120, fg_color="#d9534f", hover_color="#c9302c", command=lambda p=provider_name: self.clear_stored_key(p))
+        clear_key_button.grid(row=key_row + 1, column=0, padx=10, pady=(0, 5), sticky="w")
+        state.clear_key_button = clear_key_button
 
         if not SecureStorage:
             key_entry.configure(state=ctk.DISABLED, placeholder_text="Secure Storage Unavailable")
@@ -235,20 +356,30 @@ class SettingsWindow(ctk.CTkToplevel):
 
     def update_key_status_labels(self):
         if not SecureStorage:
-            for provider_name in self.provider_key_status_vars:
-                self.provider_key_status_vars[provider_name].set("Secure Storage Unavailable")
+            for state in self.providers.values():
+                state.key_status_var.set("Secure Storage Unavailable")
             return
-        threading.Thread(target=self._check_key_status_thread, daemon=True).start()
+        self._key_status_worker.submit(self._check_key_status_thread)
 
     def _check_key_status_thread(self):
-        for provider_name in self.provider_key_status_vars:
-            try:
-                key_exists = SecureStorage.retrieve_key(provider_name) is not None
-                status = "Key Stored Securely" if key_exists else "No Key Stored"
-                self.after(0, self.provider_key_status_vars[provider_name].set, status)
-            except Exception as e:
-                logging.error(f"Error checking key status for {provider_name}: {e}")
-                self.after(0, self.provider_key_status_vars[provider_name].set, "Error Checking Status")
+        providers = list(self.providers)
+        if not providers:
+            return
+        # One pass over the keyring backend for all providers
+        stored = SecureStorage.keys_stored(providers)
+        statuses = {}
+        for provider_name in providers:
+            key_exists = stored.get(provider_name)
+            if key_exists is None:
+                statuses[provider_name] = "Error Checking Status"
+            else:
+                statuses[provider_name] = "Key Stored Securely" if key_exists else "No Key Stored"
+        # Apply all results in a single UI-thread callback
+        self.after_idle(self._apply_key_statuses, statuses)
+
+    def _apply_key_statuses(self, statuses):
+        for provider_name, status in statuses.items():
+            self.providers[provider_name].key_status_var.set(status)
 
     def clear_stored_key(self, provider_name):
         if not SecureStorage:
@@ -257,28 +388,24 @@ class SettingsWindow(ctk.CTkToplevel):
         if messagebox.askyesno("Confirm Clear", f"Are you sure you want to delete the stored API key for {provider_name.capitalize()}? This cannot be undone.", parent=self):
             try:
                 SecureStorage.delete_key(provider_name)
-                self.provider_key_entry_vars[provider_name].set("") # Clear entry field
+                self.providers[provider_name].key_entry_var.set("") # Clear entry field
                 self.update_key_status_labels() # Refresh status
-                messagebox.showinfo("Success", f"Stored API key for {provider_name.capitalize()} deleted.", parent=self)
+                self.parent.toast(f"Stored API key for {provider_name.capitalize()} deleted.", "ok")
             except Exception as e:
                 logging.error(f"Error deleting key for {provider_name}: {e}")
                 messagebox.showerror("Error", f"Failed to delete key for {provider_name}: {e}", parent=self)
 
     def toggle_local_path_entry(self):
-        if self.storage_mode_var.get() == "local":
-            self.local_path_entry.configure(state=ctk.NORMAL)
-            # Find the browse button - assumes it's the second widget in the grid
-            browse_button = self.local_path_entry.master.grid_slaves(row=0, column=1)[0]
-            browse_button.configure(state=ctk.NORMAL)
-            self.gdrive_auth_button.configure(state=ctk.DISABLED)
-        else: # google_drive
-            self.local_path_entry.configure(state=ctk.DISABLED)
-            browse_button = self.local_path_entry.master.grid_slaves(row=0, column=1)[0]
-            browse_button.configure(state=ctk.DISABLED)
-            self.gdrive_auth_button.configure(state=ctk.NORMAL)
-            # Check initial auth status for GDrive
-            if isinstance(get_storage_manager(), GoogleDriveStorageManager):
-                if get_storage_manager().is_authenticated():
+        is_local = self.storage_mode_var.get() == "local"
+        local_state = ctk.NORMAL if is_local else ctk.DISABLED
+        self.local_path_entry.configure(state=local_state)
+        self.local_path_browse_button.configure(state=local_state)
+        self.gdrive_auth_button.configure(state=ctk.DISABLED if is_local else ctk.NORMAL)
+        if not is_local: # google_drive
+            # Check initial auth status for GDrive (in-memory check, no network I/O)
+            manager = get_storage_manager()
+            if isinstance(manager, GoogleDriveStorageManager):
+                if manager.is_authenticated():
                     self.gdrive_auth_status_var.set("Authenticated")
                 else:
                     self.gdrive_auth_status_var.set("Not Authenticated")
@@ -307,6 +434,7 @@ class SettingsWindow(ctk.CTkToplevel):
         """Starts the Google Drive authentication process in a separate thread."""
         self.gdrive_auth_button.configure(state=ctk.DISABLED, text="Authenticating...")
         self.gdrive_auth_status_var.set("Authentication in progress...")
+        # Daemon thread: the OAuth flow can wait on the browser indefinitely and must not block app exit
         threading.Thread(target=self._gdrive_auth_worker, daemon=True).start()
 
     def _gdrive_auth_worker(self):
@@ -332,79 +460,94 @@ class SettingsWindow(ctk.CTkToplevel):
             error_msg = f"Authentication error: {e}"
             logging.error(error_msg, exc_info=True)
 
-        # Update UI from the main thread using self.after
-        def update_ui():
-            self.gdrive_auth_button.configure(state=ctk.NORMAL, text="Authenticate Google Drive")
-            if success:
-                self.gdrive_auth_status_var.set("Authenticated Successfully")
-                messagebox.showinfo("Success", "Google Drive authenticated successfully!", parent=self)
-            else:
-                self.gdrive_auth_status_var.set(f"Authentication Failed: {error_msg}")
-                messagebox.showerror("Error", f"Google Drive authentication failed: {error_msg}", parent=self)
-            # Re-initialize storage manager based on the selected mode in the UI
-            # This ensures the correct manager is active after authentication attempt
-            current_mode = self.storage_mode_var.get()
-            current_path = self.local_storage_path_var.get() or None
-            initialize_storage_manager(mode=current_mode, path=current_path)
-            self.toggle_local_path_entry() # Refresh GDrive button state based on final manager
+        self.after_idle(self._finish_gdrive_auth, success, error_msg)
 
-        self.after(0, update_ui)
+    def _finish_gdrive_auth(self, success, error_msg):
+        """Updates the Storage tab once Google Drive authentication finishes (UI thread)."""
+        self.gdrive_auth_button.configure(state=ctk.NORMAL, text="Authenticate Google Drive")
+        if success:
+            self.gdrive_auth_status_var.set("Authenticated Successfully")
+            self.parent.toast("Google Drive authenticated successfully!", "ok")
+        else:
+            self.gdrive_auth_status_var.set(f"Authentication Failed: {error_msg}")
+            messagebox.showerror("Error", f"Google Drive authentication failed: {error_msg}", parent=self)
+        # Re-initialize storage manager based on the selected mode in the UI
+        # This ensures the correct manager is active after authentication attempt
+        current_mode = self.storage_mode_var.get()
+        current_path = self.local_storage_path_var.get() or None
+        initialize_storage_manager(mode=current_mode, path=current_path)
+        self.toggle_local_path_entry() # Refresh GDrive button state based on final manager
 
     def run_rag_builder_thread(self):
-        """Runs the RAG builder script in a separate thread."""
-        if not RAG_BUILDER_AVAILABLE:
+        """Runs the RAG builder in a separate thread."""
+        if not _rag_available():
             messagebox.showwarning("RAG Unavailable", "RAG dependencies (chromadb, sentence-transformers/langchain-huggingface) are not installed. Cannot build index.", parent=self)
             return
 
         self.rag_build_button.configure(state=ctk.DISABLED, text="Building Index...")
         self.rag_build_status_var.set("Building... This may take some time.")
-        threading.Thread(target=self._rag_build_worker, daemon=True).start()
+        # Daemon thread: a build can take minutes and must not block app exit or key-status checks
+        threading.Thread(target=self._rag_build_worker, name="tarvis-rag-build", daemon=True).start()
 
     def _rag_build_worker(self):
-        """Worker function to execute the rag_builder script."""
+        """Worker function that runs the RAG builder in a separate process.
+
+        The Orchestrator keeps a Chroma store open on the same directory, and chromadb caches one
+        client per path within a process, so the rebuild (which deletes and recreates that
+        directory) must not run in this process.
+        """
         success = False
         error_msg = ""
+        last_error = None
+        last_update = 0.0
         try:
-            script_path = str(PROJECT_ROOT / "src" / "rag" / "rag_builder.py")
-            python_executable = sys.executable # Use the same python that runs the GUI
-            # Use subprocess.run for simplicity if detailed output capture isn't needed immediately
-            # Ensure the working directory is the project root for correct relative paths in the script
-            result = subprocess.run([python_executable, "-m", "src.rag.rag_builder"], 
-                                    capture_output=True, text=True, check=False, cwd=str(PROJECT_ROOT))
-            
-            if result.returncode == 0:
+            # The builder logs "<time> - <LEVEL> - RAG Builder - <message>" lines; show them as
+            # progress in the status label and keep the last error for the failure dialog
+            process = subprocess.Popen([sys.executable, "-m", "src.rag.rag_builder"],
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, cwd=str(PROJECT_ROOT))
+            for line in process.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                logging.debug(f"RAG builder: {line}")
+                message = line.split(RAG_BUILDER_LOG_TAG, 1)[-1]
+                if " - ERROR - " in line or " - CRITICAL - " in line:
+                    last_error = message
+                # Throttle label updates; the final result is always shown by _finish_rag_build
+                now = time.monotonic()
+                if now - last_update >= RAG_STATUS_MIN_INTERVAL:
+                    last_update = now
+                    if len(message) > RAG_STATUS_MAX_CHARS:
+                        message = message[:RAG_STATUS_MAX_CHARS - 3] + "..."
+                    self.after_idle(self.rag_build_status_var.set, message)
+            returncode = process.wait()
+            if returncode == 0:
                 success = True
-                logging.info("RAG builder script finished successfully.")
-                logging.info(f"Builder Output:\n{result.stdout}")
+                logging.info("RAG builder finished successfully.")
             else:
-                error_msg = f"RAG builder script failed with exit code {result.returncode}."
+                error_msg = f"RAG builder failed with exit code {returncode}."
+                if last_error:
+                    error_msg += f" Error: {last_error}"
                 logging.error(error_msg)
-                logging.error(f"Builder Stderr:\n{result.stderr}")
-                logging.error(f"Builder Stdout:\n{result.stdout}")
-                # Try to extract a more specific error from stderr if possible
-                if result.stderr:
-                     error_msg += f" Error: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'Unknown error'}"
-
         except FileNotFoundError:
             error_msg = "Error: Python executable or rag_builder.py not found."
             logging.error(error_msg)
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}"
-            logging.exception("Error running RAG builder script:")
-
-        # Update UI from the main thread
-        def update_rag_ui():
-            self.rag_build_button.configure(state=ctk.NORMAL, text="Build / Rebuild RAG Index")
-            if success:
-                self.rag_build_status_var.set("RAG index built successfully!")
-                # Use self.after to schedule the messagebox call in the main thread
-                self.after(0, messagebox.showinfo, "Success", "RAG index built successfully!")
-            else:
-                self.rag_build_status_var.set(f"Error building RAG index. Check logs.")
-                # Use self.after for error messagebox too
-                self.after(0, messagebox.showerror, "Error", f"{error_msg}\nSee application logs for details.")
+            logging.exception("Error running RAG builder:")
+
+        self.after_idle(self._finish_rag_build, success, error_msg)
 
-        self.after(0, update_rag_ui)
+    def _finish_rag_build(self, success, error_msg):
+        """Restores the RAG tab and reports the build result (UI thread)."""
+        self.rag_build_button.configure(state=ctk.NORMAL, text="Build / Rebuild RAG Index")
+        if success:
+            self.rag_build_status_var.set("RAG index built successfully!")
+            self.parent.toast("RAG index built successfully!", "ok")
+        else:
+            self.rag_build_status_var.set(f"Error building RAG index. Check logs.")
+            messagebox.showerror("Error", f"{error_msg}\nSee application logs for details.", parent=self)
 
     def save_and_close(self):
         """Saves settings and closes the window."""
@@ -416,20 +559,26 @@ class SettingsWindow(ctk.CTkToplevel):
 
         # Save API provider settings
         keys_to_save = {}
-        for provider_name, vars_dict in self.provider_vars.items():
-            if provider_name not in self.settings["api_providers"]:
-                 self.settings["api_providers"][provider_name] = {}
-            self.settings["api_providers"][provider_name]["enabled"] = vars_dict["enabled"].get()
-            self.settings["api_providers"][provider_name]["model"] = vars_dict["model"].get()
-            self.settings["api_providers"][provider_name]["endpoint"] = vars_dict["endpoint"].get() or None
+        for provider_name, state in self.providers.items():
+            entry = self.settings["api_providers"].setdefault(provider_name, {})
+            entry["enabled"] = state.enabled.get()
+            entry["model"] = state.model.get()
+            entry["endpoint"] = state.endpoint.get() or None
             
             # Check if a new key was entered
-            new_key = self.provider_key_entry_vars[provider_name].get()
+            new_key = state.key_entry_var.get()
             if new_key:
                 keys_to_save[provider_name] = new_key
 
+        settings_snapshot = json.dumps(self.settings, sort_keys=True)
+        if settings_snapshot == self._saved_settings_snapshot and not keys_to_save:
+            logging.info("Settings unchanged; skipping save and backend restart.")
+            self.hide()
+            return
+
         try:
             save_settings(self.settings)
+            self._saved_settings_snapshot = settings_snapshot
             logging.info("Settings saved successfully.")
             
             # Save new API keys securely if SecureStorage is available
@@ -446,13 +595,13 @@ class SettingsWindow(ctk.CTkToplevel):
                         logging.error(f"Failed to store API key for {provider_name}: {e}")
                 
                 if saved_keys_count > 0:
-                     messagebox.showinfo("API Keys Saved", f"Successfully saved {saved_keys_count} new API key(s) securely.", parent=self)
+                     self.parent.toast(f"Successfully saved {saved_keys_count} new API key(s) securely.", "ok")
                 if failed_keys:
                      messagebox.showerror("API Key Error", f"Failed to save API key(s) for: {', '.join(failed_keys)}. Secure Storage might be unavailable or misconfigured.", parent=self)
 
             # Trigger backend restart in the parent window
             self.parent.restart_backend_thread()
-            self.destroy()
+            self.hide()
         except Exception as e:
             logging.exception("Error saving settings:")
             messagebox.showerror("Error", f"Failed to save settings: {e}", parent=self)
@@ -467,7 +616,31 @@ class MainWindow(ctk.CTk):
         # Initialize backend components
         self.orchestrator = None
         self.storage_manager = get_storage_manager() # Get initially configured manager
-        self.message_queue = queue.Queue()
+        self.message_queue = deque() # append/popleft are thread-safe; workers signal via QUEUE_EVENT
+        # Reused daemon thread for chat requests. Backend restarts and history loads get their own
+        # daemon threads since they can block on Google Drive OAuth and must not hold up chat or app exit
+        self._chat_worker = _DaemonWorker("tarvis-chat")
+        # Conversation saves run in order on their own daemon thread; on_close waits a bounded time for them
+        self._save_worker = _DaemonWorker("tarvis-save")
+        self._inserts_since_trim = 0
+        self._streaming = False # chat_history stays NORMAL from start_stream until end_stream/error
+        self._scroll_pending = False # A see(END) is scheduled for the next idle point
+        # Widgets referenced from background callbacks; created below
+        self.input_entry = self.send_button = self.progress_bar = None
+        self.settings_window = None
+        # (history file, history_mtime) of what the chat display currently shows; None forces a reload
+        self._rendered_history_key = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Workers wake the UI thread with a virtual event instead of it polling the queue
+        self.bind(QUEUE_EVENT, lambda event: self.check_message_queue())
+        # stream_chunk messages are coalesced in check_message_queue and never dispatched here
+        self._message_handlers = {
+            "history": self._on_history,
+            "history_error": self._on_history_error,
+            "start_stream": self._on_start_stream,
+            "end_stream": self._on_end_stream,
+            "error": self._on_stream_error,
+        }
 
         # --- Configure grid layout (2 rows, 2 columns) ---
         self.grid_rowconfigure(0, weight=1) # Chat history takes most space
@@ -476,7 +649,8 @@ class MainWindow(ctk.CTk):
         self.grid_columnconfigure(1, weight=0) # Settings button column
 
         # --- Chat History (Row 0, Col 0) ---
-        self.chat_history = ctk.CTkTextbox(self, state=ctk.DISABLED, wrap=tk.WORD, font=ctk.CTkFont(size=14))
+        chat_font = ctk.CTkFont(size=14) # Shared by the chat history and input entry
+        self.chat_history = ctk.CTkTextbox(self, state=ctk.DISABLED, wrap=tk.WORD, font=chat_font)
         self.chat_history.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="nsew")
         self.chat_history.tag_config("user", foreground="#007bff") # Blue for user
         self.chat_history.tag_config("assistant", foreground="#28a745") # Green for assistant
@@ -492,7 +666,7 @@ class MainWindow(ctk.CTk):
         input_frame.grid(row=1, column=0, columnspan=2, padx=10, pady=(5, 10), sticky="ew")
         input_frame.grid_columnconfigure(0, weight=1)
 
-        self.input_entry = ctk.CTkEntry(input_frame, placeholder_text="Enter your message...", font=ctk.CTkFont(size=14))
+        self.input_entry = ctk.CTkEntry(input_frame, placeholder_text="Enter your message...", font=chat_font)
         self.input_entry.grid(row=0, column=0, padx=(0, 10), pady=5, sticky="ew")
         self.input_entry.bind("<Return>", self.send_message)
 
@@ -505,114 +679,280 @@ class MainWindow(ctk.CTk):
         status_frame.grid_columnconfigure(0, weight=1)
 
         self.progress_bar = ctk.CTkProgressBar(status_frame, mode="indeterminate")
-        # Initially hide progress bar
-        # self.progress_bar.grid(row=0, column=0, padx=(0, 10), pady=2, sticky="ew") 
+        # Grid once, then hide; grid()/grid_remove() toggle it reusing these options
+        self.progress_bar.grid(row=0, column=0, padx=(0, 10), pady=2, sticky="ew")
+        self.progress_bar.grid_remove()
 
         self.status_label = ctk.CTkLabel(status_frame, text="Initializing backend...", anchor="w")
         self.status_label.grid(row=0, column=0, sticky="ew", padx=5) # Changed row to 0
 
-        # --- Load initial history and start backend ---
-        self.load_initial_history()
-        # IMPORTANT: Move backend restart call AFTER all UI elements are created
-        # self.restart_backend_thread() # Initial backend load - MOVED
-        self.after(100, self.restart_backend_thread) # Call after a short delay to ensure UI is fully drawn
+        # Transient notifications (see toast) are shown to the right of the status text
+        self.toast_label = ctk.CTkLabel(status_frame, text="", anchor="e")
+        self.toast_label.grid(row=0, column=1, sticky="e", padx=5)
+        self._toast_after_id = None
 
-        # Start checking the message queue
+        # Drain anything posted before the event loop was running
         self.after(100, self.check_message_queue)
 
+        # --- Start backend (it also loads the history) once the first paint is done ---
+        self.after_idle(self.restart_backend_thread)
+
+    def toast(self, message, level="info"):
+        """Shows a short notification in the status bar without blocking the event loop (UI thread)."""
+        self.toast_label.configure(text=message, text_color=_TOAST_COLORS.get(level, _TOAST_COLORS["info"]))
+        if self._toast_after_id is not None:
+            self.after_cancel(self._toast_after_id)
+        self._toast_after_id = self.after(TOAST_DURATION_MS, self._clear_toast)
+
+    def _clear_toast(self):
+        self._toast_after_id = None
+        self.toast_label.configure(text="")
+
+    def on_close(self):
+        """Gives pending conversation saves a bounded time to finish, then closes the app."""
+        if not self._save_worker.flush(SAVE_FLUSH_TIMEOUT_SECONDS):
+            logging.warning("Conversation saves still pending after %ss; closing without them.", SAVE_FLUSH_TIMEOUT_SECONDS)
+        self.destroy()
+
     def load_initial_history(self):
+        """Loads the conversation history off the UI thread; it is rendered from check_message_queue."""
+        threading.Thread(target=self._load_history_worker, name="tarvis-history", daemon=True).start()
+
+    def _history_key(self, storage_manager):
+        """Returns a key identifying the stored history's current version, or None if unknown."""
+        mtime = storage_manager.history_mtime()
+        if mtime is None:
+            return None
+        return (getattr(storage_manager, "filepath", None), mtime)
+
+    def _load_history_worker(self):
+        try:
+            storage_manager = self.storage_manager
+            key = self._history_key(storage_manager)
+            if key is not None and key == self._rendered_history_key:
+                logging.info("Conversation history unchanged; keeping the current display.")
+                return
+            history = storage_manager.load_conversation()
+            self.post_message("history", (key, history))
+        except Exception as e:
+            logging.error(f"Failed to load conversation history: {e}", exc_info=True)
+            self.post_message("history_error", f"Error loading history: {e}\n")
+
+    def render_history(self, history):
+        """Replaces the chat display with the given conversation history."""
         try:
-            history = self.storage_manager.load_conversation()
+            # Build the whole transcript first so the widget gets a single insert,
+            # then tag each message by its line range (robust to multi-byte characters)
+            parts = []
+            spans = []
+            line = 1
+            for message in history[-HISTORY_DISPLAY_MESSAGES:]:
+                # Storage managers save sender/message; older entries may use role/content
+                role = message.get("sender") or message.get("role", "unknown")
+                content = message.get("message", message.get("content", ""))
+                text = f"{role.capitalize()}: {content}\n\n"
+                parts.append(text)
+                line_count = text.count("\n")
+                spans.append((role, line, line + line_count))
+                line += line_count
             self.chat_history.configure(state=ctk.NORMAL)
             self.chat_history.delete("1.0", tk.END)
-            for message in history:
-                role = message.get("role", "unknown")
-                content = message.get("content", "")
-                self.display_message(f"{role.capitalize()}: {content}\n\n", role)
-            self.chat_history.configure(state=ctk.DISABLED)
+            self.chat_history.insert("1.0", "".join(parts))
+            for role, start_line, end_line in spans:
+                self.chat_history.tag_add(role, f"{start_line}.0", f"{end_line}.0")
+            self._trim_chat_history()
+            if not self._streaming:
+                self.chat_history.configure(state=ctk.DISABLED)
             self.chat_history.see(tk.END) # Scroll to bottom
             logging.info("Loaded conversation history.")
         except Exception as e:
-            logging.error(f"Failed to load conversation history: {e}", exc_info=True)
+            logging.error(f"Failed to display conversation history: {e}", exc_info=True)
             self.display_message(f"Error loading history: {e}\n", "error")
 
     def display_message(self, message, tag):
         """Appends a message to the chat history with a specific tag."""
-        self.chat_history.configure(state=ctk.NORMAL)
+        follow = self._scroll_pending or self._is_scrolled_to_end()
+        if not self._streaming:
+            self.chat_history.configure(state=ctk.NORMAL)
         self.chat_history.insert(tk.END, message, tag)
-        self.chat_history.configure(state=ctk.DISABLED)
-        self.chat_history.see(tk.END) # Auto-scroll
+        self._trim_chat_history_if_due()
+        if not self._streaming:
+            self.chat_history.configure(state=ctk.DISABLED)
+        if follow:
+            self._scroll_to_end_soon() # Auto-scroll unless the user scrolled up
+
+    def _scroll_to_end_soon(self):
+        """Scrolls the chat display to the end once the current burst of inserts is done."""
+        if not self._scroll_pending:
+            self._scroll_pending = True
+            self.after_idle(self._scroll_to_end)
+
+    def _scroll_to_end(self):
+        self._scroll_pending = False
+        self.chat_history.see(tk.END)
+
+    def _is_scrolled_to_end(self):
+        """True if the bottom of the chat display is visible (check before inserting)."""
+        return self.chat_history.yview()[1] >= 0.999
+
+    def _trim_chat_history_if_due(self):
+        """Trims the chat display every CHAT_TRIM_CHECK_INTERVAL inserts (widget must be NORMAL)."""
+        self._inserts_since_trim += 1
+        if self._inserts_since_trim >= CHAT_TRIM_CHECK_INTERVAL:
+            self._inserts_since_trim = 0
+            self._trim_chat_history()
+
+    def _trim_chat_history(self):
+        """Deletes the oldest lines so the chat display holds at most MAX_CHAT_LINES (widget must be NORMAL)."""
+        line_count = int(self.chat_history.index("end-1c").split(".")[0])
+        if line_count > MAX_CHAT_LINES:
+            self.chat_history.delete("1.0", f"{line_count - MAX_CHAT_LINES}.0")
 
     def send_message(self, event=None):
-        user_input = self.input_entry.get().strip()
-        if not user_input or self.orchestrator is None:
-            if not user_input:
+        entry = self.input_entry
+        raw_input = entry.get()
+        is_empty = not raw_input or raw_input.isspace() # No stripped copy needed to reject blank input
+        if is_empty or self.orchestrator is None:
+            if is_empty:
                 logging.warning("Attempted to send empty message.")
             if self.orchestrator is None:
                  logging.warning("Orchestrator not ready, cannot send message.")
                  self.display_message("Backend not ready. Please wait.\n", "error")
             return
 
+        user_input = raw_input.strip()
         self.display_message(f"User: {user_input}\n\n", "user")
-        self.input_entry.delete(0, tk.END)
+        entry.delete(0, tk.END)
 
         # Disable input and show progress
-        self.input_entry.configure(state=ctk.DISABLED)
+        entry.configure(state=ctk.DISABLED)
         self.send_button.configure(state=ctk.DISABLED)
-        self.progress_bar.grid(row=0, column=0, padx=(0, 10), pady=2, sticky="ew") # Show progress bar
-        self.progress_bar.start()
+        progress_bar = self.progress_bar
+        progress_bar.grid() # Show progress bar
+        progress_bar.start()
         self.status_label.configure(text="Assistant is thinking...")
 
         # Run orchestrator in a separate thread
-        threading.Thread(target=self._process_input_thread, args=(user_input,), daemon=True).start()
+        self._chat_worker.submit(self._process_input_thread, user_input)
 
     def _process_input_thread(self, user_input):
         try:
             response_stream = self.orchestrator.process_input_stream(user_input)
-            full_response = ""
-            self.message_queue.put(("start_stream", None))
+            response_parts = []
+            self.post_message("start_stream", None)
+            pending_chunks = []
+            last_flush = time.monotonic()
             for chunk in response_stream:
-                self.message_queue.put(("stream_chunk", chunk))
-                full_response += chunk
-            self.message_queue.put(("end_stream", full_response))
+                response_parts.append(chunk)
+                pending_chunks.append(chunk)
+                now = time.monotonic()
+                due = len(pending_chunks) >= STREAM_BATCH_CHUNKS or now - last_flush >= STREAM_BATCH_SECONDS
+                # If the UI is falling behind, keep coalescing here instead of growing the queue
+                if due and len(self.message_queue) < MAX_PENDING_MESSAGES:
+                    self.post_message("stream_chunk", "".join(pending_chunks))
+                    pending_chunks.clear()
+                    last_flush = now
+            if pending_chunks:
+                self.post_message("stream_chunk", "".join(pending_chunks))
+            self.post_message("end_stream", (user_input, "".join(response_parts)))
         except Exception as e:
             logging.exception("Error processing input:")
-            self.message_queue.put(("error", f"Error: {e}"))
+            self.post_message("error", f"Error: {e}")
+
+    def post_message(self, message_type, data):
+        """Queues a message for the UI thread and wakes it; safe to call from worker threads."""
+        self.message_queue.append((message_type, data))
+        try:
+            self.event_generate(QUEUE_EVENT, when="tail")
+        except (tk.TclError, RuntimeError) as e:
+            # Window destroyed or event loop not running yet; the startup drain picks it up
+            logging.debug(f"Could not signal UI thread for {message_type}: {e}")
+
+    def _save_turn_worker(self, storage_manager, user_input, response):
+        """Appends just the latest exchange; both storage managers append per message."""
+        try:
+            storage_manager.save_message("user", user_input)
+            storage_manager.save_message("assistant", response)
+            # The turn is already on screen, so the display still matches the file
+            rendered_key = self._rendered_history_key
+            if rendered_key is not None and rendered_key[0] == getattr(storage_manager, "filepath", None):
+                self._rendered_history_key = self._history_key(storage_manager)
+        except Exception as e:
+            logging.error(f"Failed to save conversation turn: {e}", exc_info=True)
 
     def check_message_queue(self):
+        """Drains all pending messages from message_queue (runs on the UI thread)."""
+        # Consecutive stream chunks are coalesced into a single insert
+        pending_chunks = []
         try:
             while True:
-                message_type, data = self.message_queue.get_nowait()
-                if message_type == "start_stream":
-                    self.display_message("Assistant: ", "assistant")
-                elif message_type == "stream_chunk":
-                    self.display_message(data, "assistant")
-                elif message_type == "end_stream":
-                    self.display_message("\n\n", "assistant") # Add spacing after response
-                    # Re-enable input and hide progress
-                    self.input_entry.configure(state=ctk.NORMAL)
-                    self.send_button.configure(state=ctk.NORMAL)
-                    self.progress_bar.stop()
-                    self.progress_bar.grid_forget() # Hide progress bar
-                    self.status_label.configure(text="Ready")
-                    # Save conversation after full response
-                    self.storage_manager.save_conversation(self.orchestrator.get_conversation_history())
-                elif message_type == "error":
-                    self.display_message(f"{data}\n\n", "error")
-                    # Re-enable input even on error
-                    self.input_entry.configure(state=ctk.NORMAL)
-                    self.send_button.configure(state=ctk.NORMAL)
-                    self.progress_bar.stop()
-                    self.progress_bar.grid_forget()
-                    self.status_label.configure(text="Error occurred. Ready.")
-        except queue.Empty:
-            pass # No messages
-        finally:
-            # Check again after 100ms
-            self.after(100, self.check_message_queue)
+                message_type, data = self.message_queue.popleft()
+                if message_type == "stream_chunk":
+                    pending_chunks.append(data)
+                    continue
+                if pending_chunks:
+                    self._on_stream_text("".join(pending_chunks))
+                    pending_chunks.clear()
+                self._message_handlers[message_type](data)
+        except IndexError:
+            pass # No more messages
+        if pending_chunks:
+            self._on_stream_text("".join(pending_chunks))
+
+    def _on_history(self, data):
+        key, history = data
+        self._rendered_history_key = key
+        self.render_history(history)
+
+    def _on_history_error(self, message):
+        self.display_message(message, "error")
+
+    def _on_start_stream(self, _):
+        # Keep the textbox editable for the whole stream instead of toggling per insert
+        self.chat_history.configure(state=ctk.NORMAL)
+        self._streaming = True
+        self._on_stream_text("Assistant: ")
+
+    def _on_stream_text(self, text):
+        # The textbox is already NORMAL while streaming, so insert directly
+        # Skip the yview() check when a scroll to the end is already pending
+        follow = self._scroll_pending or self._is_scrolled_to_end()
+        self.chat_history.insert(tk.END, text, "assistant")
+        if follow:
+            self._scroll_to_end_soon()
+
+    def _on_end_stream(self, data):
+        self._on_stream_text("\n\n") # Add spacing after response
+        self._trim_chat_history() # Once per response; stream inserts skip the periodic check
+        self._streaming = False
+        self.chat_history.configure(state=ctk.DISABLED)
+        # Re-enable input and hide progress
+        self._reset_input_state("Ready")
+        # Save the new turn after the full response, off the UI thread
+        user_input, full_response = data
+        self._save_worker.submit(self._save_turn_worker, self.storage_manager, user_input, full_response)
+
+    def _on_stream_error(self, message):
+        self._streaming = False # display_message restores DISABLED
+        self.display_message(f"{message}\n\n", "error")
+        # Re-enable input even on error
+        self._reset_input_state("Error occurred. Ready.")
+
+    def _reset_input_state(self, status_text):
+        self.input_entry.configure(state=ctk.NORMAL)
+        self.send_button.configure(state=ctk.NORMAL)
+        self.progress_bar.stop()
+        self.progress_bar.grid_remove() # Hide progress bar
+        self.status_label.configure(text=status_text)
 
     def open_settings(self):
-        if hasattr(self, "settings_window") and self.settings_window.winfo_exists():
+        if self.settings_window is not None and self.settings_window.winfo_exists():
+            if not self.settings_window.winfo_viewable():
+                # Reuse the hidden window, refreshing its values instead of rebuilding its widgets
+                self.settings_window._reload_from_disk()
+                self.settings_window.deiconify()
+                self.settings_window.grab_set()
+            self.settings_window.lift() # Bring it above the main window if it was behind
             self.settings_window.focus()
         else:
             self.settings_window = SettingsWindow(self)
@@ -622,15 +962,15 @@ class MainWindow(ctk.CTk):
         logging.info("Restarting backend...")
         self.status_label.configure(text="Restarting backend...")
         # Disable input during restart
-        if hasattr(self, 'input_entry'): # Check if widget exists before configuring
+        if self.input_entry is not None:
              self.input_entry.configure(state=ctk.DISABLED)
-        if hasattr(self, 'send_button'):
+        if self.send_button is not None:
              self.send_button.configure(state=ctk.DISABLED)
-        if hasattr(self, 'progress_bar'):
-             self.progress_bar.grid(row=0, column=0, padx=(0, 10), pady=2, sticky="ew")
+        if self.progress_bar is not None:
+             self.progress_bar.grid()
              self.progress_bar.start()
         
-        threading.Thread(target=self._restart_backend_worker, daemon=True).start()
+        threading.Thread(target=self._restart_backend_worker, name="tarvis-backend", daemon=True).start()
 
     def _restart_backend_worker(self):
         """Worker function to initialize/re-initialize the orchestrator."""
@@ -639,11 +979,12 @@ class MainWindow(ctk.CTk):
         try:
             # Re-initialize storage manager based on potentially updated settings
             self.storage_manager = initialize_storage_manager()
-            # Load history using the potentially new storage manager
-            # We need to update the UI from the main thread
-            self.after(0, self.load_initial_history)
+            # Load history using the potentially new storage manager (rendered via the message queue)
+            self.load_initial_history()
 
             # Initialize Orchestrator
+            # Imported here so GUI startup doesn't pay for the LLM/agent stack; cached after the first restart
+            from src.core.orchestrator import Orchestrator
             self.orchestrator = Orchestrator()
             if self.orchestrator.is_ready():
                 success = True
@@ -657,29 +998,32 @@ class MainWindow(ctk.CTk):
             logging.exception(error_msg)
             self.orchestrator = None # Ensure orchestrator is None on error
 
-        # Update UI from the main thread
-        def update_status():
-            if hasattr(self, 'progress_bar'): # Check if widget exists
-                 self.progress_bar.stop()
-                 self.progress_bar.grid_forget()
-            if success:
-                self.status_label.configure(text="Backend ready.")
-                if hasattr(self, 'input_entry'):
-                     self.input_entry.configure(state=ctk.NORMAL)
-                if hasattr(self, 'send_button'):
-                     self.send_button.configure(state=ctk.NORMAL)
-            else:
-                self.status_label.configure(text=f"Backend Error: {error_msg}")
-                # Keep input disabled if backend failed
-                if hasattr(self, 'input_entry'):
-                     self.input_entry.configure(state=ctk.DISABLED)
-                if hasattr(self, 'send_button'):
-                     self.send_button.configure(state=ctk.DISABLED)
-                self.display_message(f"CRITICAL ERROR: Backend failed to initialize. Please check settings and logs. {error_msg}\n", "error")
-
-        self.after(0, update_status)
+        self.after_idle(self._finish_backend_restart, success, error_msg)
+
+    def _finish_backend_restart(self, success, error_msg):
+        """Re-enables or locks the input controls after a backend restart (UI thread)."""
+        if self.progress_bar is not None:
+             self.progress_bar.stop()
+             self.progress_bar.grid_remove()
+        if success:
+            self.status_label.configure(text="Backend ready.")
+            if self.input_entry is not None:
+                 self.input_entry.configure(state=ctk.NORMAL)
+            if self.send_button is not None:
+                 self.send_button.configure(state=ctk.NORMAL)
+        else:
+            self.status_label.configure(text=f"Backend Error: {error_msg}")
+            # Keep input disabled if backend failed
+            if self.input_entry is not None:
+                 self.input_entry.configure(state=ctk.DISABLED)
+            if self.send_button is not None:
+                 self.send_button.configure(state=ctk.DISABLED)
+            self.display_message(f"CRITICAL ERROR: Backend failed to initialize. Please check settings and logs. {error_msg}\n", "error")
 
 if __name__ == "__main__":
+    # Configure basic logging for the GUI only when run as the app entry point
+    if not logging.getLogger().hasHandlers():
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - GUI - %(message)s")
     ctk.set_appearance_mode("System") # Modes: "System" (default), "Dark", "Light"
     ctk.set_default_color_theme("blue") # Themes: "blue" (default), "green", "dark-blue"
     app = MainWindow()
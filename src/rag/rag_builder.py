@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import os
+import sys
 import logging
 from pathlib import Path
 import shutil # For removing old store
@@ -26,8 +27,14 @@ KNOWLEDGE_BASE_DIR = PROJECT_ROOT / "knowledge_base"
 VECTOR_STORE_DIR = PROJECT_ROOT / "vector_store"
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 
-def build_vector_store():
-    """Loads documents, splits them, generates embeddings, and saves to ChromaDB."""
+def build_index(knowledge_base_dir=KNOWLEDGE_BASE_DIR, persist_dir=VECTOR_STORE_DIR):
+    """Loads documents from knowledge_base_dir, splits them, generates embeddings, and saves to ChromaDB at persist_dir.
+
+    Returns True on success. The GUI runs this module as a subprocess (the app's Orchestrator holds
+    a Chroma store open on persist_dir), so __main__ exits non-zero on failure.
+    """
+    knowledge_base_dir = Path(knowledge_base_dir)
+    persist_dir = Path(persist_dir)
     if not IMPORT_SUCCESS:
         logging.error("Cannot build vector store due to missing dependencies.")
         return False
@@ -35,35 +42,35 @@ def build_vector_store():
     logging.info("Starting vector store build process...")
 
     # --- 1. Check and Create Knowledge Base Directory ---
-    if not KNOWLEDGE_BASE_DIR.exists():
-        logging.warning(f"Knowledge base directory 	'{KNOWLEDGE_BASE_DIR}' not found. Creating it.")
+    if not knowledge_base_dir.exists():
+        logging.warning(f"Knowledge base directory 	'{knowledge_base_dir}' not found. Creating it.")
         try:
-            KNOWLEDGE_BASE_DIR.mkdir(parents=True, exist_ok=True)
+            knowledge_base_dir.mkdir(parents=True, exist_ok=True)
             # Add a placeholder file if the directory was just created and is empty
-            placeholder_file = KNOWLEDGE_BASE_DIR / "placeholder.txt"
-            if not any(KNOWLEDGE_BASE_DIR.iterdir()): # Check if directory is empty
+            placeholder_file = knowledge_base_dir / "placeholder.txt"
+            if not any(knowledge_base_dir.iterdir()): # Check if directory is empty
                  with open(placeholder_file, "w") as f:
                      f.write("Please add your knowledge base documents (e.g., .txt, .md) to this directory.")
                  logging.info(f"Created placeholder file in empty knowledge base directory: {placeholder_file}")
         except Exception as e:
             logging.error(f"Failed to create knowledge base directory: {e}")
             return False
-    elif not any(KNOWLEDGE_BASE_DIR.iterdir()):
-         logging.warning(f"Knowledge base directory 	'{KNOWLEDGE_BASE_DIR}' is empty. Vector store will be empty.")
+    elif not any(knowledge_base_dir.iterdir()):
+         logging.warning(f"Knowledge base directory 	'{knowledge_base_dir}' is empty. Vector store will be empty.")
          # Optionally, create placeholder if it doesn't exist even if dir exists
-         placeholder_file = KNOWLEDGE_BASE_DIR / "placeholder.txt"
+         placeholder_file = knowledge_base_dir / "placeholder.txt"
          if not placeholder_file.exists():
               with open(placeholder_file, "w") as f:
                   f.write("Please add your knowledge base documents (e.g., .txt, .md) to this directory.")
               logging.info(f"Created placeholder file in empty knowledge base directory: {placeholder_file}")
 
     # --- 2. Load Documents ---
-    logging.info(f"Loading documents from: {KNOWLEDGE_BASE_DIR}")
+    logging.info(f"Loading documents from: {knowledge_base_dir}")
     try:
         # Use DirectoryLoader with glob to support multiple types, ensure recursive
         # Using TextLoader explicitly for .txt as a fallback example if needed
         loader = DirectoryLoader(
-            str(KNOWLEDGE_BASE_DIR),
+            str(knowledge_base_dir),
             glob="**/*[.txt|.md]", # Load .txt and .md files recursively
             loader_cls=TextLoader, # Specify loader for matched files
             use_multithreading=True, # Speed up loading
@@ -106,12 +113,12 @@ def build_vector_store():
         return False
 
     # --- 5. Create/Update Vector Store ---
-    logging.info(f"Building Chroma vector store at: {VECTOR_STORE_DIR}")
+    logging.info(f"Building Chroma vector store at: {persist_dir}")
     try:
         # Remove old store directory if it exists to ensure a fresh build
-        if VECTOR_STORE_DIR.exists():
-            logging.info(f"Removing existing vector store at {VECTOR_STORE_DIR}...")
-            shutil.rmtree(VECTOR_STORE_DIR)
+        if persist_dir.exists():
+            logging.info(f"Removing existing vector store at {persist_dir}...")
+            shutil.rmtree(persist_dir)
         
         # Create the vector store from documents
         # Chroma.from_documents handles the embedding process internally
@@ -119,13 +126,13 @@ def build_vector_store():
             vector_store = Chroma.from_documents(
                 documents=chunks,
                 embedding=embeddings,
-                persist_directory=str(VECTOR_STORE_DIR)
+                persist_directory=str(persist_dir)
             )
             vector_store.persist() # Ensure data is saved
             logging.info("Successfully built and persisted vector store.")
         else:
             # Create the directory anyway so the app doesn't complain about it missing
-            VECTOR_STORE_DIR.mkdir(parents=True, exist_ok=True)
+            persist_dir.mkdir(parents=True, exist_ok=True)
             logging.info("Vector store directory created, but it is empty as no document chunks were processed.")
             
     except Exception as e:
@@ -135,10 +142,15 @@ def build_vector_store():
     logging.info("Vector store build process completed successfully.")
     return True
 
+def build_vector_store():
+    """Builds the vector store for the default project knowledge base."""
+    return build_index(KNOWLEDGE_BASE_DIR, VECTOR_STORE_DIR)
+
 if __name__ == "__main__":
     # Make the script runnable directly for testing or manual builds
-    if build_vector_store():
+    if build_index():
         print("\nVector store build process finished successfully.")
     else:
         print("\nVector store build process failed. Check logs for details.")
+        sys.exit(1)
 
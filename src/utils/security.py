@@ -3,7 +3,7 @@
 
 import keyring
 import logging
-from typing import Optional
+from typing import Dict, Iterable, Optional
 
 # Configure basic logging for security utilities
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - Security - %(message)s")
@@ -59,6 +59,31 @@ class SecureStorage:
             # Returning None might be safer for non-critical operations
             return None
 
+    @staticmethod
+    def keys_stored(provider_names: Iterable[str]) -> Dict[str, Optional[bool]]:
+        """Checks which providers have an API key stored, resolving the keyring backend once.
+
+        Args:
+            provider_names: The API provider names to check.
+
+        Returns:
+            A dict mapping each provider name to True (key stored), False (no key),
+            or None if the lookup for that provider failed.
+        """
+        results = {}
+        try:
+            backend = keyring.get_keyring()
+        except Exception as e:
+            logging.error(f"Failed to access keyring backend: {e}", exc_info=True)
+            return {provider_name: None for provider_name in provider_names}
+        for provider_name in provider_names:
+            try:
+                results[provider_name] = bool(backend.get_password(KEYRING_SERVICE_NAME, provider_name))
+            except Exception as e:
+                logging.error(f"Failed to check API key for provider '{provider_name}': {e}", exc_info=True)
+                results[provider_name] = None
+        return results
+
     @staticmethod
     def delete_key(provider_name: str):
         """Deletes a stored API key for a given provider.
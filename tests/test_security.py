@@ -0,0 +1,32 @@
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Module to test
+from src.utils.security import SecureStorage, KEYRING_SERVICE_NAME
+
+# --- Test SecureStorage.keys_stored ---
+
+@patch("src.utils.security.keyring.get_keyring")
+def test_keys_stored_uses_backend_once(mock_get_keyring):
+    """Test all providers are checked against a single resolved keyring backend."""
+    mock_backend = MagicMock()
+    mock_backend.get_password.side_effect = lambda service, name: "sk-123" if name == "openai" else None
+    mock_get_keyring.return_value = mock_backend
+
+    result = SecureStorage.keys_stored(["openai", "deepseek"])
+
+    assert result == {"openai": True, "deepseek": False}
+    mock_get_keyring.assert_called_once()
+    mock_backend.get_password.assert_any_call(KEYRING_SERVICE_NAME, "openai")
+    mock_backend.get_password.assert_any_call(KEYRING_SERVICE_NAME, "deepseek")
+
+@patch("src.utils.security.keyring.get_keyring")
+def test_keys_stored_reports_lookup_errors(mock_get_keyring):
+    """Test a failing lookup is reported as None without hiding the other results."""
+    mock_backend = MagicMock()
+    mock_backend.get_password.side_effect = [RuntimeError("locked"), "sk-456"]
+    mock_get_keyring.return_value = mock_backend
+
+    result = SecureStorage.keys_stored(["openai", "deepseek"])
+
+    assert result == {"openai": None, "deepseek": True}
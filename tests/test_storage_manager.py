@@ -1,8 +1,9 @@
 import pytest
 import json
 import os
+import threading
 from pathlib import Path
-from unittest.mock import patch, mock_open, MagicMock
+from unittest.mock import patch, mock_open, MagicMock, ANY
 from datetime import datetime
 
 # Modules to test
@@ -13,7 +14,9 @@ from src.core.storage_manager import (
     save_settings,
     get_storage_manager,
     initialize_storage_manager,
-    SCOPES
+    SCOPES,
+    SIMPLE_UPLOAD_MAX_BYTES,
+    OAUTH_TIMEOUT_SECONDS
 )
 
 # --- Test Fixtures ---
@@ -95,6 +98,33 @@ def test_load_settings_invalid_json(mock_exists, mock_path, tmp_path):
     settings = load_settings()
     assert settings["storage_mode"] == "local" # Default value
 
+@patch("src.core.storage_manager.Path")
+def test_load_settings_cached_until_file_changes(mock_path, mock_settings_file):
+    """Test repeated loads reuse the parsed settings until the file is rewritten."""
+    mock_path.return_value.resolve.return_value.parent.parent.parent.__truediv__.return_value.__truediv__.return_value = mock_settings_file
+
+    with patch("src.core.storage_manager.json.load", wraps=json.load) as mock_json_load:
+        first = load_settings()
+        first["storage_mode"] = "mutated"
+        second = load_settings()
+        assert mock_json_load.call_count == 1
+        assert second["storage_mode"] == "local" # Callers get their own copy
+
+        save_settings({"storage_mode": "google_drive"})
+        third = load_settings()
+        assert mock_json_load.call_count == 2
+        assert third["storage_mode"] == "google_drive"
+
+@patch("src.core.storage_manager.Path")
+def test_save_settings_replaces_file_atomically(mock_path, mock_settings_file):
+    """Test settings are written via a temp file that replaces settings.json."""
+    mock_path.return_value.resolve.return_value.parent.parent.parent.__truediv__.return_value.__truediv__.return_value = mock_settings_file
+
+    save_settings({"storage_mode": "google_drive"})
+
+    assert json.loads(mock_settings_file.read_text(encoding="utf-8")) == {"storage_mode": "google_drive"}
+    assert not (mock_settings_file.parent / "settings.json.tmp").exists()
+
 @patch("src.core.storage_manager.Path")
 @patch("builtins.open", new_callable=mock_open)
 @patch("json.dump")
@@ -154,6 +184,7 @@ def test_local_storage_save_message(mock_json_dump, mock_file_open, mock_path, m
     filepath = manager.filepath
 
     manager.save_message("User", "Hello")
+    manager.flush()
 
     # Check file was opened for read then write
     assert mock_file_open.call_count == 2
@@ -169,6 +200,30 @@ def test_local_storage_save_message(mock_json_dump, mock_file_open, mock_path, m
     assert saved_history[1]["message"] == "Hello"
     assert "timestamp" in saved_history[1]
 
+def test_local_storage_batches_queued_messages(tmp_path):
+    """Test queued messages are written by the background writer and visible on load."""
+    manager = LocalStorageManager(filename="batch_test.json", storage_path=str(tmp_path))
+
+    for i in range(5):
+        manager.save_message("User", f"Message {i}")
+    history = manager.load_history() # Waits for the writer to drain the queue
+
+    assert [entry["message"] for entry in history] == [f"Message {i}" for i in range(5)]
+    assert json.loads((tmp_path / "batch_test.json").read_text(encoding="utf-8")) == history
+
+def test_local_storage_history_mtime_tracks_writes(tmp_path):
+    """Test history_mtime is None before the first save and changes after each write."""
+    manager = LocalStorageManager(filename="mtime_test.json", storage_path=str(tmp_path))
+    assert manager.history_mtime() is None
+
+    manager.save_message("User", "First")
+    first = manager.history_mtime() # Flushes the queued write before checking
+    assert first is not None
+    assert manager.history_mtime() == first
+
+    manager.save_message("User", "Second")
+    assert manager.history_mtime() != first
+
 @patch("src.core.storage_manager.Path")
 @patch("builtins.open", new_callable=mock_open, read_data='[{"sender": "User", "message": "Hi"}]')
 @patch("pathlib.Path.exists") # Patch exists globally for this test
@@ -239,6 +294,87 @@ def test_gdrive_storage_init(mock_path, mock_getenv, mock_home_dir):
     assert manager.service is None # Not authenticated yet
     assert manager.file_id is None
 
+@patch("src.core.storage_manager.Path")
+def test_gdrive_save_message_reuses_cached_history(mock_path, mock_home_dir):
+    """Test that saving only downloads the Drive history once per session."""
+    mock_path.home.return_value = mock_home_dir
+    manager = GoogleDriveStorageManager()
+    manager.service = MagicMock()
+    manager.file_id = "file123"
+    files = manager.service.files.return_value
+    # Nobody else writes the file: Drive reports the version of our own last upload
+    version = {"version": "1"}
+    files.get.return_value.execute.side_effect = lambda: dict(version)
+    def upload(**kwargs):
+        version["version"] = str(int(version["version"]) + 1)
+        return MagicMock(execute=MagicMock(return_value=dict(version)))
+    files.update.side_effect = upload
+
+    with patch.object(manager, "_download_history", return_value=[{"sender": "Old", "message": "Msg"}]) as mock_download:
+        manager.save_message("User", "Hello")
+        manager.save_message("Jarvis", "Hi there")
+        history = manager.load_history()
+
+    mock_download.assert_called_once()
+    assert [entry["sender"] for entry in history] == ["Old", "User", "Jarvis"]
+    assert files.update.call_count == 2
+
+@patch("src.core.storage_manager.Path")
+def test_gdrive_save_message_redownloads_after_remote_change(mock_path, mock_home_dir):
+    """Test a save re-downloads the history when another instance changed the Drive file."""
+    mock_path.home.return_value = mock_home_dir
+    manager = GoogleDriveStorageManager()
+    manager.service = MagicMock()
+    manager.file_id = "file123"
+    files = manager.service.files.return_value
+    files.update.return_value.execute.return_value = {"version": "2"}
+    files.get.return_value.execute.side_effect = [{"version": "1"}, {"version": "5"}]
+    downloads = [[{"sender": "Old", "message": "Msg"}],
+                 [{"sender": "Old", "message": "Msg"}, {"sender": "User", "message": "Hello"},
+                  {"sender": "Other", "message": "From another machine"}]]
+
+    with patch.object(manager, "_download_history", side_effect=downloads) as mock_download:
+        manager.save_message("User", "Hello")
+        manager.save_message("Jarvis", "Hi there")
+
+    assert mock_download.call_count == 2
+    assert [entry["sender"] for entry in manager._cached_history] == ["Old", "User", "Other", "Jarvis"]
+
+@patch("src.core.storage_manager.MediaInMemoryUpload")
+@patch("src.core.storage_manager.Path")
+def test_gdrive_large_history_uses_resumable_upload(mock_path, mock_upload, mock_home_dir):
+    """Test histories over the 5 MB simple upload limit are uploaded resumably."""
+    mock_path.home.return_value = mock_home_dir
+    manager = GoogleDriveStorageManager()
+    manager.service = MagicMock()
+    manager.file_id = "file123"
+    manager._cached_history = []
+    manager._cached_version = "1"
+    manager.service.files.return_value.get.return_value.execute.return_value = {"version": "1"}
+    manager.service.files.return_value.update.return_value.execute.return_value = {"version": "1"}
+
+    manager.save_message("User", "Hello")
+    assert mock_upload.call_args.kwargs["resumable"] is False
+
+    manager.save_message("User", "x" * SIMPLE_UPLOAD_MAX_BYTES)
+    assert mock_upload.call_args.kwargs["resumable"] is True
+
+@patch("src.core.storage_manager.MediaIoBaseDownload", side_effect=OSError("network down"))
+@patch("src.core.storage_manager.Path")
+def test_gdrive_failed_download_does_not_overwrite_history(mock_path, mock_download, mock_home_dir):
+    """Test a failed history download is not cached and blocks uploads that would replace the file."""
+    mock_path.home.return_value = mock_home_dir
+    manager = GoogleDriveStorageManager()
+    manager.service = MagicMock()
+    manager.file_id = "file123"
+
+    assert manager.load_history() == []
+    manager.save_message("User", "hi")
+
+    manager.service.files.return_value.update.assert_not_called()
+    assert manager._cached_history is None # Next use retries the download
+    assert mock_download.call_count == 2
+
 @patch("src.core.storage_manager.GoogleDriveStorageManager._ensure_file_exists")
 @patch("src.core.storage_manager.build")
 @patch("pickle.dump")
@@ -283,10 +419,118 @@ def test_gdrive_storage_authenticate_new_token(mock_exists, mock_path, mock_flow
     mock_flow_instance.run_local_server.assert_called_once()
     mock_file_open.assert_called_once_with(token_path, "wb")
     mock_pickle_dump.assert_called_once_with(mock_creds, mock_file_open())
-    mock_build.assert_called_once_with("drive", "v3", credentials=mock_creds)
+    mock_build.assert_called_once_with("drive", "v3", http=ANY, cache_discovery=False, static_discovery=True)
     assert manager.service == mock_service
     mock_ensure_file.assert_called_once() # Ensure file check happens after auth
 
+@patch("src.core.storage_manager.Path")
+def test_gdrive_authenticates_lazily_once(mock_path, mock_home_dir):
+    """Test the first save triggers authentication and a failed attempt is not repeated."""
+    mock_path.home.return_value = mock_home_dir
+    manager = GoogleDriveStorageManager()
+
+    with patch.object(manager, "authenticate", return_value=False) as mock_auth:
+        manager.save_message("User", "Hello")
+        assert manager.load_history() == []
+
+    mock_auth.assert_called_once()
+    assert manager.is_authenticated() is False
+
+@patch("src.core.storage_manager.Path")
+def test_gdrive_authenticate_waits_for_running_attempt(mock_path, mock_home_dir):
+    """Test an explicit authenticate() call waits for a background attempt instead of running its own flow."""
+    mock_path.home.return_value = mock_home_dir
+    manager = GoogleDriveStorageManager()
+    flow_started = threading.Event()
+    release_flow = threading.Event()
+    calls = []
+
+    def fake_authenticate(force_reauth=False):
+        calls.append(threading.current_thread().name)
+        flow_started.set()
+        release_flow.wait(timeout=5)
+        return False
+
+    with patch.object(manager, "_authenticate", side_effect=fake_authenticate):
+        warm_up = threading.Thread(target=manager._ensure_authenticated, name="warm-up")
+        warm_up.start()
+        assert flow_started.wait(timeout=5)
+        explicit = threading.Thread(target=manager.authenticate, name="explicit")
+        explicit.start()
+        explicit.join(timeout=0.2)
+        assert explicit.is_alive() # Blocked on the auth lock, no second flow started
+        assert calls == ["warm-up"]
+        release_flow.set()
+        warm_up.join(timeout=5)
+        explicit.join(timeout=5)
+
+    assert calls == ["warm-up", "explicit"]
+
+@patch("src.core.storage_manager.InstalledAppFlow")
+@patch("src.core.storage_manager.Path")
+def test_gdrive_abandoned_oauth_flow_releases_lock(mock_path, mock_flow, mock_home_dir):
+    """Test an OAuth flow the user never completes times out and frees the auth lock."""
+    mock_path.home.return_value = mock_home_dir
+    manager = GoogleDriveStorageManager()
+    manager.credentials_path = mock_home_dir / "credentials.json"
+    manager.credentials_path.write_text("{}")
+    manager.token_path = mock_home_dir / "missing_token.json"
+    # run_local_server gives up after timeout_seconds without a redirect; the library then fails
+    mock_flow.from_client_secrets_file.return_value.run_local_server.side_effect = AttributeError(
+        "'NoneType' object has no attribute 'replace'")
+
+    assert manager.authenticate() is False
+
+    run_kwargs = mock_flow.from_client_secrets_file.return_value.run_local_server.call_args.kwargs
+    assert run_kwargs["timeout_seconds"] == OAUTH_TIMEOUT_SECONDS
+    # Another thread can take the lock, i.e. it was not left held by the abandoned flow
+    acquired = []
+    def try_lock():
+        if manager._auth_lock.acquire(timeout=1):
+            acquired.append(True)
+            manager._auth_lock.release()
+    checker = threading.Thread(target=try_lock)
+    checker.start()
+    checker.join(timeout=5)
+    assert acquired == [True]
+
+@patch("src.core.storage_manager.Path")
+def test_gdrive_ensure_file_exists_single_lookup(mock_path, mock_home_dir):
+    """Test folder and history file are resolved from one files().list call."""
+    mock_path.home.return_value = mock_home_dir
+    manager = GoogleDriveStorageManager(filename="hist.json", folder_name="History")
+    manager.service = MagicMock()
+    manager.service.files.return_value.list.return_value.execute.return_value = {
+        "files": [
+            {"id": "folder1", "name": "History", "mimeType": "application/vnd.google-apps.folder"},
+            {"id": "other", "name": "hist.json", "mimeType": "application/json", "parents": ["elsewhere"]},
+            {"id": "file1", "name": "hist.json", "mimeType": "application/json", "parents": ["folder1"]},
+        ]
+    }
+
+    manager._ensure_file_exists()
+    manager._ensure_file_exists() # Already resolved, must not query Drive again
+
+    assert manager.file_id == "file1"
+    manager.service.files.return_value.list.assert_called_once()
+    manager.service.files.return_value.create.assert_not_called()
+
+@patch("src.core.storage_manager.Path")
+def test_gdrive_folder_query_is_escaped(mock_path, mock_home_dir):
+    """Test quotes in folder names are escaped in Drive queries."""
+    mock_path.home.return_value = mock_home_dir
+    manager = GoogleDriveStorageManager(folder_name="Bob's History")
+    manager.service = MagicMock()
+    manager.service.files.return_value.list.return_value.execute.return_value = {
+        "files": [{"id": "folder1", "name": "Bob's History", "mimeType": "application/vnd.google-apps.folder"}]
+    }
+
+    assert manager._find_or_create_folder() == "folder1"
+    assert manager._find_or_create_folder() == "folder1" # Cached
+    query = manager.service.files.return_value.list.call_args.kwargs["q"]
+    assert "name='Bob\\'s History'" in query
+    manager.service.files.return_value.list.assert_called_once()
+
 # --- Test Unified Storage Factory ---
 
 @patch("src.core.storage_manager.LocalStorageManager")